@@ -0,0 +1,16 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш (в том числе страниц для анонимных пользователей) живет
+    в процессе и не должен переходить из теста в тест."""
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails(settings):
+    """Миниатюры создаются сразу после фиксации транзакции: фоновый
+    поток не должен писать во временный MEDIA_ROOT после теста."""
+    settings.THUMBNAIL_WORKERS = 0
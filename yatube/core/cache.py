@@ -0,0 +1,269 @@
+import atexit
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_INTERVAL = 1.0
+CULL_CHECK_EVERY = 100
+ACCESS_RESOLUTION = 1.0
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'expires REAL, accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    'name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+)
+NOT_EXPIRED = '(expires IS NULL OR expires > ?)'
+
+
+class SharedSQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для всех процессов одного хоста.
+
+    LOCATION - путь к файлу; для работы в памяти файл кладется в tmpfs
+    (/dev/shm). В отличие от LocMemCache, запись и сброс версий видны
+    всем воркерам gunicorn, а внешний сервис (Redis, Memcached)
+    не нужен. Вытесняются давно не читавшиеся записи (LRU), incr
+    атомарен между процессами. Статистика попаданий доступна через
+    stats() и команду cache_stats.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._hits = self._misses = self._sets = 0
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self._flush_stats)
+
+    @property
+    def _connection(self):
+        # Соединение свое у каждого потока и у каждого процесса
+        # (после fork унаследованное соединение использовать нельзя).
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            local.connection.execute('PRAGMA journal_mode=WAL')
+            local.connection.execute('PRAGMA synchronous=OFF')
+            for statement in SCHEMA:
+                local.connection.execute(statement)
+            local.pid = os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _count(self, hits=0, misses=0):
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+            if (self._hits + self._misses < STATS_FLUSH_EVERY
+                    and time.monotonic() - self._flushed
+                    < STATS_FLUSH_INTERVAL):
+                return
+        self._flush_stats()
+
+    def _flush_stats(self):
+        with self._lock:
+            deltas = [
+                delta for delta in (('hits', self._hits),
+                                    ('misses', self._misses))
+                if delta[1]
+            ]
+            self._hits = self._misses = 0
+            self._flushed = time.monotonic()
+        if not deltas:
+            return
+        self._connection.executemany(
+            'INSERT INTO stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            deltas
+        )
+
+    def _get_rows(self, keys):
+        now = time.time()
+        rows = self._connection.execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({", ".join("?" * len(keys))}) AND {NOT_EXPIRED}',
+            [*keys, now]
+        ).fetchall()
+        # Время доступа для LRU обновляется не чаще раза в
+        # ACCESS_RESOLUTION секунд, чтобы чтения редко превращались в запись.
+        stale = [
+            key for key, value, accessed in rows
+            if now - accessed > ACCESS_RESOLUTION
+        ]
+        if stale:
+            self._connection.execute(
+                f'UPDATE cache SET accessed = ? '
+                f'WHERE key IN ({", ".join("?" * len(stale))})',
+                [now, *stale]
+            )
+        self._count(hits=len(rows), misses=len(keys) - len(rows))
+        return {key: pickle.loads(value) for key, value, accessed in rows}
+
+    def _set_rows(self, connection, items, timeout):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            [
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 expires, now)
+                for key, value in items
+            ]
+        )
+        with self._lock:
+            self._sets += len(items)
+            check = self._sets >= CULL_CHECK_EVERY
+            if check:
+                self._sets = 0
+        if check:
+            self._cull(connection, now)
+
+    def _cull(self, connection, now):
+        """Удаляет просроченные записи, а при превышении MAX_ENTRIES -
+        1/CULL_FREQUENCY записей, к которым дольше всего не обращались."""
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', [now])
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            [max(count - self._max_entries, count // self._cull_frequency)]
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_rows([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {
+            self.make_and_validate_key(key, version=version): key
+            for key in keys
+        }
+        if not keys:
+            return {}
+        return {
+            keys[key]: value
+            for key, value in self._get_rows(list(keys)).items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+            [key, time.time()]
+        ).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._transaction() as connection:
+            self._set_rows(connection, [(key, value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = [
+            (self.make_and_validate_key(key, version=version), value)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            self._set_rows(connection, items, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._transaction() as connection:
+            if connection.execute(
+                f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+                [key, time.time()]
+            ).fetchone():
+                return False
+            self._set_rows(connection, [(key, value)], timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+                [key, time.time()]
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key]
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {NOT_EXPIRED}',
+            [self.get_backend_timeout(timeout), key, time.time()]
+        ).rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection.execute(
+            'DELETE FROM cache WHERE key = ?', [key]).rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version)
+                for key in keys]
+        if keys:
+            self._connection.execute(
+                f'DELETE FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(keys))})',
+                keys
+            )
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def stats(self):
+        """Статистика кеша по всем процессам: попадания, промахи,
+        доля попаданий и число записей."""
+        self._flush_stats()
+        connection = self._connection
+        stats = dict(connection.execute('SELECT name, value FROM stats'))
+        hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4)
+            if hits + misses else None,
+            'entries': connection.execute(
+                'SELECT COUNT(*) FROM cache').fetchone()[0],
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = self._misses = 0
+        self._connection.execute('DELETE FROM stats')
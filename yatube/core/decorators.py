@@ -0,0 +1,14 @@
+def query_budget(max_queries):
+    """Объявляет максимальное количество SQL-запросов представления.
+    Проверяется QueryBudgetMiddleware в режиме DEBUG и тестами."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def cache_for_anonymous(view_func):
+    """Разрешает AnonymousPageCacheMiddleware кешировать ответы
+    представления анонимным пользователям."""
+    view_func.cache_for_anonymous = True
+    return view_func
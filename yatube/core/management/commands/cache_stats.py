@@ -0,0 +1,27 @@
+import json
+
+from django.core.cache import caches
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит в формате JSON статистику попаданий кешей, '
+        'которые ее поддерживают (core.cache.SharedSQLiteCache).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить статистику после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        stats = {}
+        for alias in caches:
+            cache = caches[alias]
+            if hasattr(cache, 'stats'):
+                stats[alias] = cache.stats()
+                if options['reset']:
+                    cache.reset_stats()
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,53 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceededError(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """В режиме DEBUG считает SQL-запросы запроса и сообщает о превышении
+    бюджета, объявленного декоратором query_budget (или
+    QUERY_BUDGET_DEFAULT). При QUERY_BUDGET_RAISE бросает исключение."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DEBUG:
+            return self.get_response(request)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        return self.check_budget(request, response, counter.count)
+
+    def check_budget(self, request, response, count):
+        budget = getattr(request, 'query_budget', None)
+        if budget is None or count <= budget:
+            return response
+        message = (
+            f'{request.method} {request.path}: {count} '
+            f'SQL-запросов при бюджете {budget}'
+        )
+        if settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceededError(message)
+        logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(
+            view_func, 'query_budget', settings.QUERY_BUDGET_DEFAULT)
@@ -13,3 +13,14 @@ class CreatedFieldModel(models.Model):
         ordering = ('-created',)
         verbose_name = 'Дата создания'
         verbose_name_plural = 'Даты создания'
+
+
+class StoredFile(models.Model):
+    """Файл в хранилище с адресацией по содержимому
+    (core.storage.ContentAddressedStorage) и число ссылок на него."""
+    name = models.CharField('Имя', max_length=255, primary_key=True)
+    refs = models.IntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
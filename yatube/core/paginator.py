@@ -0,0 +1,135 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+NEXT, PREVIOUS = 'n', 'p'
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации. Повторяет интерфейс Page,
+    но вместо номеров страниц содержит курсоры соседних страниц."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (по умолчанию (created, id)) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: выборка идет по индексу от
+    позиции, закодированной в непрозрачном курсоре.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, keys=('created', 'id'),
+                 descending=True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = keys
+        self.descending = descending
+
+    def encode_cursor(self, direction, obj):
+        values = [getattr(obj, key) for key in self.keys]
+        payload = json.dumps(
+            [direction, [str(value) for value in values]],
+            separators=(',', ':')
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(payload)
+            if direction not in (NEXT, PREVIOUS) or (
+                    len(values) != len(self.keys)):
+                raise InvalidCursorError(cursor)
+            meta = self.object_list.model._meta
+            return direction, [
+                meta.get_field(key).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (ValueError, TypeError, binascii.Error,
+                FieldDoesNotExist, ValidationError) as error:
+            raise InvalidCursorError(cursor) from error
+
+    def seek(self, object_list, values, forward):
+        """Отбирает объекты, лежащие после позиции values."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            condition |= Q(
+                **dict(zip(self.keys[:index], values[:index])),
+                **{f'{key}__{lookup}': values[index]}
+            )
+        return object_list.filter(condition)
+
+    def order(self, object_list, forward):
+        prefix = '-' if forward == self.descending else ''
+        return object_list.order_by(*(prefix + key for key in self.keys))
+
+    def page(self, cursor=None):
+        direction, values = NEXT, None
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        forward = direction == NEXT
+        object_list = self.object_list
+        if values is not None:
+            object_list = self.seek(object_list, values, forward)
+        rows = list(
+            self.order(object_list, forward)[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self, None, None)
+        has_next = has_more if forward else True
+        has_previous = values is not None if forward else has_more
+        return CursorPage(
+            rows,
+            self,
+            self.encode_cursor(NEXT, rows[-1]) if has_next else None,
+            self.encode_cursor(PREVIOUS, rows[0]) if has_previous else None
+        )
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: вместо некорректного курсора или
+        курсора, за которым не осталось объектов, отдает первую страницу."""
+        try:
+            page = self.page(cursor)
+        except InvalidCursorError:
+            return self.page()
+        if cursor and not page:
+            return self.page()
+        return page
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from core.models import StoredFile
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+# Число уровней вложенных каталогов и длина имени каждого (в символах
+# хеша): 2 уровня по 2 символа - 65536 каталогов.
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - SHA-256 его содержимого.
+
+    Файл из upload_to 'posts/' сохраняется как
+    posts/ab/cd/abcd....jpg: вложенные каталоги не дают разрастись
+    одному каталогу, одинаковые загрузки хранятся один раз. Число
+    ссылок на файл ведется в core.models.StoredFile: save() его
+    увеличивает, delete() уменьшает и удаляет файл, когда ссылок
+    не осталось. Чтение - как у FileSystemStorage, поэтому исходники
+    для sorl-thumbnail открываются как обычно.
+    """
+    refcounted = True
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory, base = posixpath.split(name)
+        shards = [
+            hexdigest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+            for level in range(SHARD_DEPTH)
+        ]
+        return posixpath.join(
+            directory, *shards,
+            hexdigest + posixpath.splitext(base)[1].lower()
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self._save(self.content_name(name, content), content)
+        self.add_reference(name)
+        return name
+
+    def _save(self, name, content):
+        path = self.path(name)
+        try:
+            # Повторная загрузка: свежее время изменения защищает файл
+            # от сборки мусора (posts.garbage) так же, как новый.
+            os.utime(path)
+            return name
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись во временный файл и атомарное переименование: процесс,
+        # одновременно сохраняющий то же содержимое, не увидит
+        # недописанный файл. Права - как у FileSystemStorage (0o666
+        # с учетом umask), иначе файлы не прочитает nginx.
+        temporary = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(os.open(temporary, self.OS_OPEN_FLAGS, 0o666), 'wb') as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary, self.file_permissions_mode)
+        os.replace(temporary, path)
+        return name
+
+    def add_reference(self, name):
+        StoredFile.objects.get_or_create(name=name, defaults={'refs': 0})
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+    def delete(self, name):
+        """Уменьшает число ссылок на файл и удаляет его после фиксации
+        транзакции, если ссылок не осталось и файл не загрузили
+        заново."""
+        files = StoredFile.objects.filter(name=name)
+        with transaction.atomic():
+            files.update(refs=F('refs') - 1)
+            files.filter(refs__lte=0).delete()
+            if files.exists():
+                return
+
+        def delete_unreferenced():
+            if not files.exists():
+                super(ContentAddressedStorage, self).delete(name)
+
+        transaction.on_commit(delete_unreferenced)
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя - одинаковое содержимое: файл не переименовывается.
+        return name
+
+
+def release(storage, name):
+    """Освобождает ссылку на файл name, если storage ведет подсчет
+    ссылок. Из обычных хранилищ файлы не удаляются: их убирает
+    сборка мусора."""
+    if name and getattr(storage, 'refcounted', False):
+        storage.delete(name)
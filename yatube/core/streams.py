@@ -0,0 +1,71 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+
+class MergedStreams:
+    """Слияние (k-way merge) нескольких querysets, упорядоченных по одним
+    и тем же ключам keys, в одну упорядоченную последовательность.
+
+    Поддерживает то подмножество интерфейса QuerySet, которое нужно
+    Paginator и CursorPaginator: filter(), order_by(), count() и срезы.
+    Срез [a:b] читает из каждого потока не более b строк; объекты
+    с одинаковыми ключами, пришедшие из разных потоков, выдаются один раз.
+    count() точен, если потоки не пересекаются.
+    """
+    ordered = True
+
+    def __init__(self, streams, keys, model, descending=True):
+        self.streams = list(streams)
+        self.keys = keys
+        self.model = model
+        self.descending = descending
+
+    def __repr__(self):
+        return f'<MergedStreams of {len(self.streams)} streams>'
+
+    def _clone(self, streams, descending=None):
+        return MergedStreams(
+            streams,
+            self.keys,
+            self.model,
+            self.descending if descending is None else descending
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._clone(
+            stream.filter(*args, **kwargs) for stream in self.streams)
+
+    def order_by(self, *fields):
+        return self._clone(
+            (stream.order_by(*fields) for stream in self.streams),
+            descending=fields[0].startswith('-')
+        )
+
+    def count(self):
+        return sum(stream.count() for stream in self.streams)
+
+    def merge(self, limit=None):
+        key = attrgetter(*self.keys)
+        streams = (
+            stream if limit is None else stream[:limit]
+            for stream in self.streams
+        )
+        previous = None
+        for obj in heapq.merge(*streams, key=key, reverse=self.descending):
+            if previous is None or key(obj) != previous:
+                previous = key(obj)
+                yield obj
+
+    def __iter__(self):
+        return self.merge()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None:
+                raise ValueError('Шаг среза не поддерживается.')
+            return list(islice(self.merge(index.stop), index.start,
+                               index.stop))
+        for obj in islice(self.merge(index + 1), index, None):
+            return obj
+        raise IndexError(index)
@@ -1,3 +1,12 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import Process
+
+from core.cache import CULL_CHECK_EVERY, SharedSQLiteCache
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+from django.core.files.base import ContentFile
 from django.test import TestCase
 
 
@@ -6,3 +15,112 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+def increment(cache, times):
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SharedSQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.location = os.path.join(directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SharedSQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Записи одного экземпляра видны другому (другому процессу)."""
+        self.cache.set('key', {'value': 1})
+        self.cache.set_many({'a': 1, 'b': None})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': 1})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {'a': 1, 'b': None})
+        self.assertFalse(other.add('key', 2))
+        self.assertTrue(other.add('new', 2))
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get_or_set('new', 3), 2)
+
+    def test_expired_values_are_missing(self):
+        """Просроченные записи не читаются и не мешают add."""
+        self.cache.set('key', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('key', 2))
+
+    def test_incr_is_atomic_between_processes(self):
+        """incr атомарен для нескольких процессов."""
+        self.cache.set('counter', 0)
+        processes = [
+            Process(target=increment, args=(self.cache, 25))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 100)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_ENTRIES=CULL_CHECK_EVERY // 2)
+        cache.set_many({
+            f'key-{index}': index for index in range(CULL_CHECK_EVERY - 1)})
+        cache._connection.execute('UPDATE cache SET accessed = accessed - 60')
+        cache.get('key-0')
+        cache.set('last', 'value')
+        self.assertEqual(cache.get('key-0'), 0)
+        self.assertEqual(cache.get('last'), 'value')
+        self.assertIsNone(cache.get('key-1'))
+        self.assertLessEqual(cache.stats()['entries'], CULL_CHECK_EVERY // 2)
+
+    def test_stats(self):
+        """Статистика считает попадания и промахи всех экземпляров."""
+        other = self.make_cache()
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        other.get('missing')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 0))
+        self.assertEqual(other.stats()['misses'], 1)
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.storage = ContentAddressedStorage(location=directory)
+
+    def test_files_are_named_by_content_and_deduplicated(self):
+        """Одинаковое содержимое хранится один раз в каталогах
+        по хешу, файл удаляется после освобождения всех ссылок."""
+        name = self.storage.save('posts/a.TXT', ContentFile(b'data'))
+        self.assertRegex(
+            name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.txt$')
+        self.assertEqual(
+            self.storage.save('posts/b.txt', ContentFile(b'data')), name)
+        other = self.storage.save('posts/c.txt', ContentFile(b'other'))
+        self.assertNotEqual(other, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertTrue(self.storage.exists(other))
+
+    def test_repeated_upload_refreshes_modification_time(self):
+        """Повторная загрузка того же содержимого обновляет время
+        изменения файла: сборка мусора не примет его за старый."""
+        name = self.storage.save('posts/a.txt', ContentFile(b'data'))
+        os.utime(self.storage.path(name), (0, 0))
+        self.storage.save('posts/b.txt', ContentFile(b'data'))
+        self.assertGreater(os.stat(self.storage.path(name)).st_mtime, 0)
@@ -0,0 +1,117 @@
+"""Измерение времени ответа основных страниц на данных разного объема."""
+import tracemalloc
+from statistics import quantiles
+from time import perf_counter
+
+from core.middleware import QueryCounter
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from posts.models import Group, Post, User
+from posts.seeding import seed
+
+TIERS = {
+    'small': dict(users=100, groups=10, posts=1000, comments=3000),
+    'medium': dict(users=1000, groups=50, posts=20000, comments=60000),
+    'large': dict(users=10000, groups=500, posts=200000, comments=600000),
+}
+REPEAT = 50
+# Свой кеш в памяти процесса: общий кеш (SHARED_CACHE_PATH) живых
+# воркеров нельзя ни очищать, ни наполнять страницами тестовой базы.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+def benchmark_urls():
+    """Адреса страниц для замеров: самые тяжелые автор, группа и пост,
+    лента подписок пользователя с наибольшим числом подписок."""
+    author = User.objects.order_by('-counters__followers_count').first()
+    reader = User.objects.order_by('-counters__followings_count').first()
+    group = Group.objects.order_by('-posts_count').first()
+    post = Post.objects.annotate(
+        total=Count('comments')).order_by('-total').first()
+    urls = {
+        'index': reverse('posts:index'),
+        'authors': reverse('posts:authors'),
+        'groups': reverse('posts:groups'),
+        'follow_index': reverse('posts:follow_index'),
+    }
+    if author:
+        urls['profile'] = reverse('posts:profile', args=[author.username])
+    if group:
+        urls['group_posts'] = reverse('posts:group_list', args=[group.slug])
+    if post:
+        urls['post_detail'] = reverse('posts:post_detail', args=[post.pk])
+    return reader, urls
+
+
+def percentile(points, value):
+    return round(points[value - 1] * 1000, 2)
+
+
+def measure(client, url, repeat, cold):
+    """Один прогон с подсчетом запросов и пиковой памяти,
+    затем repeat прогонов с замером времени."""
+    cache.clear()
+    counter = QueryCounter()
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(counter):
+            status = client.get(url).status_code
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        start = perf_counter()
+        client.get(url)
+        timings.append(perf_counter() - start)
+    points = quantiles(timings, n=100)
+    return {
+        'status': status,
+        'p50_ms': percentile(points, 50),
+        'p95_ms': percentile(points, 95),
+        'p99_ms': percentile(points, 99),
+        'queries': counter.count,
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def benchmark(volumes, repeat=REPEAT, cold=False, random_seed=None,
+              log=None):
+    """Наполняет текущую базу объемами volumes (см. seed) и замеряет
+    страницы. Возвращает {имя страницы: метрики}.
+    Замеры идут с DEBUG = False, как в боевом окружении, и с отдельным
+    кешем CACHES."""
+    with override_settings(DEBUG=False, CACHES=CACHES):
+        seed(**volumes, random_seed=random_seed, log=log)
+        reader, urls = benchmark_urls()
+        client = Client()
+        client.force_login(reader)
+        return {
+            name: measure(client, url, repeat, cold)
+            for name, url in urls.items()
+        }
+
+
+def compare(results, baseline):
+    """Добавляет к метрикам изменение p50 и p95 относительно baseline
+    в процентах."""
+    for tier, pages in results.items():
+        for name, metrics in pages.items():
+            base = baseline.get(tier, {}).get(name)
+            if not base:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if base[key]:
+                    metrics[f'{key}_change_percent'] = round(
+                        (metrics[key] - base[key]) / base[key] * 100, 1)
+    return results
@@ -0,0 +1,92 @@
+"""Версии кешированных данных и защита от лавинного пересчета.
+
+Версия входит в ключи записей кеша. Изменение данных увеличивает версию,
+после чего старые записи больше не читаются и вытесняются по TTL,
+поэтому TTL можно делать большим, не рискуя показать устаревшие данные.
+"""
+import random
+import time
+
+from django.core.cache import cache
+
+FEED = 'feed'
+PAGES = 'pages'
+
+# Доля TTL, на которую случайно сокращается срок свежести записи,
+# чтобы записи, созданные одновременно, не устаревали одновременно.
+JITTER = 0.1
+# Сколько устаревшая запись хранится и отдается, пока ее пересчитывают.
+STALE_TIMEOUT = 5 * 60
+# Блокировка пересчета и ожидание чужого пересчета, с.
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def initial_version():
+    # Если версия вытеснена из кеша, новая не должна совпасть ни с одной
+    # из прежних: начинаем с текущего времени в миллисекундах.
+    return time.time_ns() // 1000000
+
+
+def get_version(name):
+    return cache.get_or_set(version_key(name), initial_version, None)
+
+
+def bump_version(*names):
+    for name in names:
+        try:
+            cache.incr(version_key(name))
+        except ValueError:
+            cache.add(version_key(name), initial_version(), None)
+
+
+def jittered(timeout):
+    return timeout * (1 - JITTER * random.random())
+
+
+def _compute_and_store(key, compute, timeout):
+    value = compute()
+    if timeout is None:
+        cache.set(key, (value, None), None)
+    else:
+        cache.set(
+            key,
+            (value, time.time() + jittered(timeout)),
+            timeout + STALE_TIMEOUT
+        )
+    return value
+
+
+def get_or_compute(key, compute, timeout):
+    """Значение из кеша по key или результат compute().
+
+    Пересчитывает значение только один процесс - тот, кто взял
+    блокировку. Остальные в это время получают устаревшее значение
+    (stale-while-revalidate), а если его нет - ждут пересчета
+    до LOCK_WAIT секунд. Срок свежести слегка случаен (JITTER).
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until is None or time.time() < fresh_until:
+            return value
+    lock = f'lock:{key}'
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            return _compute_and_store(key, compute, timeout)
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        return entry[0]
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
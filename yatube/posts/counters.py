@@ -0,0 +1,124 @@
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from posts.models import (Comment, Follow, Group, GroupFollow, Post, User,
+                          UserCounters, count_subquery)
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'followings_count': (Follow, 'user'),
+    'group_follows_count': (GroupFollow, 'user'),
+}
+GROUP_COUNTERS = {
+    'posts_count': (Post, 'group'),
+    'followers_count': (GroupFollow, 'group'),
+}
+BATCH_SIZE = 1000
+
+
+def _increments(deltas):
+    return {
+        name: Greatest(F(name) + delta, 0)
+        for name, delta in deltas.items()
+    }
+
+
+def bump_user(user, **deltas):
+    """Изменяет счетчики пользователя на величины deltas.
+    Если записи со счетчиками еще нет, она создается пересчетом."""
+    if not UserCounters.objects.filter(user=user).update(
+            **_increments(deltas)):
+        recount_users(User.objects.filter(pk=user.pk))
+
+
+def bump_users(name, deltas):
+    """Изменяет счетчик name нескольких пользователей одним запросом.
+    deltas - словарь {pk пользователя: изменение}."""
+    if not deltas:
+        return
+    updated = UserCounters.objects.filter(user__in=deltas).update(**{
+        name: Greatest(F(name) + Case(
+            *(When(user=pk, then=Value(delta))
+              for pk, delta in deltas.items()),
+            default=Value(0)
+        ), 0)
+    })
+    if updated < len(deltas):
+        recount_users(
+            User.objects.filter(pk__in=deltas, counters__isnull=True))
+
+
+def bump_group(group, **deltas):
+    """Изменяет счетчики группы на величины deltas."""
+    if group is not None:
+        Group.objects.filter(pk=group.pk).update(**_increments(deltas))
+
+
+def _batches(queryset, fields, batch_size):
+    rows = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = None
+    while True:
+        batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1][0]
+
+
+def recount_users(queryset=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Пересчитывает счетчики пользователей из queryset.
+    Возвращает количество исправленных (или созданных) записей."""
+    queryset = User.objects.all() if queryset is None else queryset
+    fields = tuple(USER_COUNTERS)
+    queryset = queryset.annotate(**{
+        f'actual_{name}': count_subquery(*source)
+        for name, source in USER_COUNTERS.items()
+    })
+    repaired = 0
+    for batch in _batches(
+            queryset, [f'actual_{name}' for name in fields], batch_size):
+        stored = UserCounters.objects.in_bulk([row[0] for row in batch])
+        to_create, to_update = [], []
+        for pk, *values in batch:
+            actual = dict(zip(fields, values))
+            counters = stored.get(pk)
+            if counters is None:
+                to_create.append(UserCounters(user_id=pk, **actual))
+            elif any(getattr(counters, name) != value
+                     for name, value in actual.items()):
+                for name, value in actual.items():
+                    setattr(counters, name, value)
+                to_update.append(counters)
+        repaired += len(to_create) + len(to_update)
+        if not dry_run:
+            UserCounters.objects.bulk_create(
+                to_create, ignore_conflicts=True)
+            UserCounters.objects.bulk_update(to_update, fields)
+    return repaired
+
+
+def recount_groups(queryset=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Пересчитывает счетчики групп из queryset.
+    Возвращает количество исправленных записей."""
+    queryset = Group.objects.all() if queryset is None else queryset
+    fields = tuple(GROUP_COUNTERS)
+    queryset = queryset.annotate(**{
+        f'actual_{name}': count_subquery(*source)
+        for name, source in GROUP_COUNTERS.items()
+    })
+    repaired = 0
+    for batch in _batches(
+            queryset, fields + tuple(f'actual_{name}' for name in fields),
+            batch_size):
+        to_update = []
+        for pk, *values in batch:
+            stored = dict(zip(fields, values[:len(fields)]))
+            actual = dict(zip(fields, values[len(fields):]))
+            if stored != actual:
+                to_update.append(Group(pk=pk, **actual))
+        repaired += len(to_update)
+        if not dry_run:
+            Group.objects.bulk_update(to_update, fields)
+    return repaired
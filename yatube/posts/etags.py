@@ -0,0 +1,56 @@
+"""ETag страниц для условных GET-запросов (см. django.views.decorators
+.http.condition).
+
+ETag вычисляется одним индексным запросом до рендера страницы и
+включает версию PAGES (ее увеличивают записи через представления),
+время последнего поста или комментария, счетчики, пользователя,
+для которого построена страница, и его CSRF-токен. Совпадение
+с If-None-Match дает ответ 304 без рендера.
+"""
+import hashlib
+
+from django.db.models import Max
+from django.middleware.csrf import get_token
+from posts.cache import PAGES, get_version
+from posts.models import Group, Post, User
+
+
+def make_etag(request, *values):
+    csrf_secret = None
+    if request.user.is_authenticated:
+        # Формы страницы содержат CSRF-токен, а он меняется при входе:
+        # старая страница из кеша браузера не прошла бы проверку CSRF.
+        get_token(request)
+        csrf_secret = request.META['CSRF_COOKIE']
+    return hashlib.md5(repr(
+        (get_version(PAGES), request.user.pk, csrf_secret, values)
+    ).encode()).hexdigest()
+
+
+def index_etag(request):
+    return make_etag(
+        request, Post.objects.aggregate(last=Max('created'))['last'])
+
+
+def group_posts_etag(request, slug):
+    group = Group.objects.filter(slug=slug).annotate(
+        last=Max('posts__created')
+    ).values_list('posts_count', 'followers_count', 'last').first()
+    return group and make_etag(request, *group)
+
+
+def profile_etag(request, username):
+    author = User.objects.filter(username=username).annotate(
+        last=Max('posts__created')
+    ).values_list(
+        'counters__posts_count', 'counters__comments_count',
+        'counters__followers_count', 'counters__followings_count', 'last'
+    ).first()
+    return author and make_etag(request, *author)
+
+
+def post_detail_etag(request, post_id):
+    post = Post.objects.filter(pk=post_id).annotate(
+        last=Max('comments__created')
+    ).values_list('last').first()
+    return post and make_etag(request, *post)
@@ -0,0 +1,68 @@
+"""Подписки пользователя на авторов и сообщества одним набором.
+
+Набор загружается одним запросом, хранится в кеше под ключом
+пользователя и запоминается в объекте запроса, поэтому проверка
+подписки в представлениях и шаблонах не требует запросов к базе.
+Ключ удаляется из кеша при подписке и отписке (см. signals).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+from posts.models import Follow, GroupFollow
+
+AUTHOR = 'author'
+GROUP = 'group'
+
+
+class FollowSet:
+    """Первичные ключи авторов и сообществ, на которые подписан
+    пользователь. Пустой набор - для анонимного пользователя."""
+
+    def __init__(self, author_ids=(), group_ids=()):
+        self.author_ids = frozenset(author_ids)
+        self.group_ids = frozenset(group_ids)
+
+    def follows_author(self, author):
+        return author.pk in self.author_ids
+
+    def follows_group(self, group):
+        return group.pk in self.group_ids
+
+
+def follow_set_key(user_id):
+    return f'follow_set:{user_id}'
+
+
+def load_follow_set(user_id):
+    rows = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', Value(AUTHOR)
+    ).union(
+        GroupFollow.objects.filter(user_id=user_id).values_list(
+            'group_id', Value(GROUP)),
+        all=True
+    )
+    ids = {AUTHOR: [], GROUP: []}
+    for pk, kind in rows:
+        ids[kind].append(pk)
+    return FollowSet(ids[AUTHOR], ids[GROUP])
+
+
+def get_follow_set(request):
+    """Набор подписок текущего пользователя, не более одного
+    обращения к кешу и одного запроса к базе на запрос."""
+    if not hasattr(request, '_follow_set'):
+        user = request.user
+        if not user.is_authenticated:
+            request._follow_set = FollowSet()
+        else:
+            key = follow_set_key(user.pk)
+            follow_set = cache.get(key)
+            if follow_set is None:
+                follow_set = load_follow_set(user.pk)
+                cache.set(key, follow_set, settings.FOLLOW_SET_CACHE_TIMEOUT)
+            request._follow_set = follow_set
+    return request._follow_set
+
+
+def invalidate_follow_set(user_id):
+    cache.delete(follow_set_key(user_id))
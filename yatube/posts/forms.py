@@ -1,4 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+from posts.images import normalize_image
 from posts.models import Comment, Post
 
 
@@ -7,6 +12,37 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Новое изображение проверяется по объему и числу пикселей
+        (по заголовку, без декодирования), затем уменьшается
+        и очищается от метаданных (см. posts.images)."""
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        if image.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            raise forms.ValidationError(
+                'Размер файла не должен превышать %(size)s.',
+                code='file_too_large',
+                params={
+                    'size': filesizeformat(
+                        settings.POST_IMAGE_MAX_UPLOAD_SIZE)
+                }
+            )
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Изображение не должно быть больше %(pixels)s Мпикс.',
+                code='too_many_pixels',
+                params={'pixels': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6}
+            )
+        try:
+            return normalize_image(image)
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise forms.ValidationError(
+                'Не удалось обработать изображение: файл поврежден.',
+                code='invalid_image'
+            )
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
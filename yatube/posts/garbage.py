@@ -0,0 +1,205 @@
+"""Сборка мусора в media.
+
+Файлы изображений удаленных и отредактированных постов и их миниатюры
+остаются на диске. Сборка мусора загружает из базы множество имен
+изображений, на которые ссылаются посты, и удаляет пачками:
+- записи хранилища ключей sorl об изображениях без ссылок вместе
+  с их миниатюрами;
+- файлы в каталоге загрузки изображений постов без ссылок
+  (и их учет в core.models.StoredFile);
+- файлы миниатюр, о которых хранилище ключей sorl не знает.
+Файлы моложе min_age секунд не трогаются: они могут принадлежать
+еще не зафиксированной транзакции (повторная загрузка того же
+содержимого в core.storage обновляет время изменения файла).
+Перед удалением каждая пачка изображений сверяется с базой еще раз.
+"""
+import os
+import time
+from contextlib import suppress
+from itertools import islice
+
+from core.models import StoredFile
+from posts.models import Post
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+BATCH_SIZE = 1000
+MIN_AGE = 60 * 60
+
+
+def batches(objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def referenced_images():
+    return set(
+        Post.objects.exclude(image='').values_list('image', flat=True)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def stored_files(storage, directory, min_age):
+    """(имя, размер) файлов каталога directory хранилища storage,
+    измененных больше min_age секунд назад."""
+    deadline = time.time() - min_age
+    for path, _, names in os.walk(storage.path(directory)):
+        for name in names:
+            full_name = os.path.join(path, name)
+            with suppress(FileNotFoundError):
+                stat = os.stat(full_name)
+                if stat.st_mtime <= deadline:
+                    yield (
+                        os.path.relpath(full_name, storage.location)
+                        .replace(os.sep, '/'),
+                        stat.st_size
+                    )
+
+
+def unreferenced(names):
+    """Имена из names, на которые не ссылается ни один пост: пока
+    шла сборка, изображение могли загрузить заново."""
+    referenced = set(
+        Post.objects.filter(image__in=names).values_list('image', flat=True))
+    return [name for name in names if name not in referenced]
+
+
+def remove(storage, names):
+    for name in names:
+        with suppress(FileNotFoundError):
+            os.remove(storage.path(name))
+
+
+def thumbnail_names(key):
+    kvstore = default.kvstore
+    names = set()
+    for thumbnail_key in kvstore._get(key, identity='thumbnails') or []:
+        thumbnail = kvstore._get(thumbnail_key)
+        if thumbnail is not None:
+            names.add(thumbnail.name)
+    return names
+
+
+def thumbnail_sources(referenced):
+    """Исходники из хранилища ключей sorl: имена миниатюр исходников
+    со ссылками и исходники без ссылок."""
+    kvstore = default.kvstore
+    live, stale = set(), []
+    for key in kvstore._find_keys(identity='thumbnails'):
+        source = kvstore._get(key)
+        if source is None or source.name not in referenced:
+            stale.append((key, source))
+        else:
+            live |= thumbnail_names(key)
+    return live, stale
+
+
+def collect_stale_sources(stale, live, report, batch_size, log):
+    """Удаляет записи исходников без ссылок. Исходники, на которые
+    сослались посты во время сборки, остаются, а их миниатюры
+    добавляются в live. Возвращает число удаленных записей."""
+    kvstore = default.kvstore
+    count = 0
+    for batch in batches(stale, batch_size):
+        names = set(unreferenced(
+            [source.name for _, source in batch if source is not None]))
+        for key, source in batch:
+            if source is not None and source.name not in names:
+                live |= thumbnail_names(key)
+                continue
+            count += 1
+            if report:
+                continue
+            if source is None:
+                kvstore._delete(key, identity='thumbnails')
+            else:
+                kvstore.delete(source)
+        log(f'  записи sorl: {len(batch)}')
+    return count
+
+
+def collect_files(storage, directory, keep, report, min_age, batch_size,
+                  log, on_delete=None, recheck=None):
+    """Удаляет файлы каталога, имен которых нет в keep. recheck
+    перед удалением отбирает из пачки имена, которые все еще
+    можно удалить. Возвращает число файлов и их объем."""
+    count = size = 0
+    orphans = (
+        (name, file_size)
+        for name, file_size in stored_files(storage, directory, min_age)
+        if not keep(name)
+    )
+    for batch in batches(orphans, batch_size):
+        if recheck:
+            names = set(recheck([name for name, _ in batch]))
+            batch = [item for item in batch if item[0] in names]
+        names = [name for name, _ in batch]
+        count += len(batch)
+        size += sum(file_size for _, file_size in batch)
+        if not report:
+            remove(storage, names)
+            if on_delete:
+                on_delete(names)
+        log(f'  {directory}: {len(batch)}')
+    return count, size
+
+
+def forget_stored_files(names):
+    StoredFile.objects.filter(name__in=names).delete()
+
+
+def collect_garbage(report=False, min_age=MIN_AGE, batch_size=BATCH_SIZE,
+                    log=None):
+    """Удаляет (при report - только подсчитывает) изображения
+    без ссылок и лишние миниатюры. Возвращает статистику."""
+    log = log or (lambda message: None)
+    field = Post._meta.get_field('image')
+    referenced = referenced_images()
+    log(f'Изображений со ссылками: {len(referenced)}')
+    live, stale = thumbnail_sources(referenced)
+    stats = {
+        'referenced': len(referenced),
+        'stale_sources': collect_stale_sources(
+            stale, live, report, batch_size, log),
+    }
+    stats['orphan_images'], stats['orphan_images_bytes'] = collect_files(
+        field.storage, field.upload_to, referenced.__contains__,
+        report, min_age, batch_size, log, forget_stored_files, unreferenced
+    )
+    # Миниатюры высокой плотности (name@2x.jpg) в хранилище ключей
+    # не записываются: их судьба - как у основной миниатюры.
+    stats['orphan_thumbnails'], stats['orphan_thumbnails_bytes'] = (
+        collect_files(
+            default.storage, thumbnail_settings.THUMBNAIL_PREFIX,
+            lambda name: name in live or base_thumbnail(name) in live,
+            report, min_age, batch_size, log
+        )
+    )
+    stale_records = [
+        name for name in StoredFile.objects.values_list(
+            'name', flat=True).iterator(BATCH_SIZE)
+        if name not in referenced
+        and not is_recent(field.storage, name, min_age)
+    ]
+    stats['stale_stored_files'] = len(stale_records)
+    if not report:
+        for batch in batches(stale_records, batch_size):
+            forget_stored_files(unreferenced(batch))
+    stats['report'] = report
+    return stats
+
+
+def is_recent(storage, name, min_age):
+    try:
+        return os.stat(storage.path(name)).st_mtime > time.time() - min_age
+    except FileNotFoundError:
+        return False
+
+
+def base_thumbnail(name):
+    stem, extension = os.path.splitext(name)
+    return stem.rsplit('@', 1)[0] + extension
@@ -0,0 +1,71 @@
+"""Обработка изображений постов при загрузке.
+
+Исходники с телефона весят десятки мегабайт, а для показа нужны лишь
+миниатюры. Поэтому изображение уменьшается до POST_IMAGE_MAX_SIZE,
+поворачивается по EXIF, лишается метаданных (EXIF, XMP, комментариев)
+и перекодируется в том же формате: имя файла и расширение
+не меняются. Из MPO (JPEG с телефона) остается основной кадр
+в JPEG. Анимированные изображения и редкие форматы сохраняются
+как есть.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Параметры перекодирования по форматам.
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'GIF': {'optimize': True},
+    'WEBP': {'method': 4},
+}
+LOSSY = ('JPEG', 'WEBP')
+# Форматы, из которых сохраняется только основной кадр: MPO - снимки
+# большинства телефонов, JPEG с дополнительными кадрами (превью,
+# стереопара, карта глубины).
+PRIMARY_FRAME = {'MPO': 'JPEG'}
+# Что остается от метаданных: без них искажаются цвета и прозрачность.
+KEEP_INFO = ('icc_profile', 'transparency', 'background')
+
+
+def open_image(file):
+    """Открывает изображение без декодирования: доступны формат
+    и размеры. Большие загрузки читаются из временного файла."""
+    path = getattr(file, 'temporary_file_path', None)
+    if path:
+        return Image.open(path())
+    file.seek(0)
+    return Image.open(file)
+
+
+def normalize_image(file):
+    """Уменьшенная и очищенная от метаданных копия загруженного
+    изображения file с тем же именем или сам file, если его формат
+    не перекодируется."""
+    image = open_image(file)
+    format_ = image.format
+    if format_ in PRIMARY_FRAME:
+        format_ = PRIMARY_FRAME[format_]
+    elif getattr(image, 'n_frames', 1) > 1:
+        return file
+    if format_ not in SAVE_OPTIONS:
+        return file
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    if format_ == 'JPEG':
+        # Декодирование JPEG сразу в уменьшенном в 2-8 раз масштабе.
+        image.draft(image.mode, max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEEP_INFO
+    }
+    options = dict(SAVE_OPTIONS[format_])
+    if format_ in LOSSY:
+        options['quality'] = settings.POST_IMAGE_QUALITY
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, format_, **options, **image.info)
+    return SimpleUploadedFile(file.name, output.getvalue(), file.content_type)
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from posts.benchmark import REPEAT, TIERS, benchmark, compare
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа, количество SQL-запросов и пиковую память '
+        'основных страниц на данных разного объема. Данные создаются '
+        'во временной тестовой базе. Результат выводится в формате JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tiers', nargs='+', choices=TIERS, default=list(TIERS),
+            help='Объемы данных для замеров.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=REPEAT,
+            help='Количество запросов каждой страницы.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора данных.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON-файл предыдущего прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результата (по умолчанию - стандартный вывод).'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 2:
+            raise CommandError('Для перцентилей нужно хотя бы 2 запроса.')
+        results = {}
+        for tier in options['tiers']:
+            self.stderr.write(f'{tier}: {TIERS[tier]}')
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+            try:
+                results[tier] = benchmark(
+                    TIERS[tier],
+                    repeat=options['repeat'],
+                    cold=options['cold'],
+                    random_seed=options['seed'],
+                    log=self.stderr.write
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                compare(results, json.load(file))
+        report = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
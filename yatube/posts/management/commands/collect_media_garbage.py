@@ -0,0 +1,34 @@
+import json
+
+from django.core.management import BaseCommand
+from posts.garbage import BATCH_SIZE, MIN_AGE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения, на которые не ссылается ни один пост, '
+        'и лишние миниатюры, выводит статистику в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report', action='store_true',
+            help='Только подсчитать мусор, ничего не удаляя.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=MIN_AGE,
+            help='Не трогать файлы моложе заданного числа секунд.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество файлов и записей в одной пачке удаления.'
+        )
+
+    def handle(self, *args, **options):
+        stats = collect_garbage(
+            report=options['report'],
+            min_age=options['min_age'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write
+        )
+        self.stdout.write(json.dumps(stats, indent=2))
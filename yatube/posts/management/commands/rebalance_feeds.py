@@ -0,0 +1,19 @@
+import json
+
+from django.core.management import BaseCommand
+from posts.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит авторов между раскладкой постов по лентам (push) '
+        'и чтением из таблицы постов (pull) по числу подписчиков, '
+        'выводит статистику в JSON. Запускается периодически.'
+    )
+
+    def handle(self, *args, **options):
+        stats = {
+            'pulled': FeedEntry.objects.pull(),
+            'pushed': FeedEntry.objects.push(),
+        }
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand
+from posts.counters import BATCH_SIZE, recount_groups, recount_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики пользователей и групп.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество записей, обрабатываемых за один запрос.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать количество расхождений.'
+        )
+
+    def handle(self, *args, **options):
+        users = recount_users(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+        groups = recount_groups(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+        action = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: пользователей - {users}, '
+            f'групп - {groups}.'
+        ))
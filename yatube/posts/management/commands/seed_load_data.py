@@ -0,0 +1,68 @@
+from time import monotonic
+
+from django.core.management import BaseCommand
+from posts.seeding import BATCH_SIZE, PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными для нагрузочного '
+        f'тестирования. Пароль всех пользователей - "{PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей.'
+        )
+        parser.add_argument(
+            '--groups', type=int, default=50,
+            help='Количество групп.'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=10000,
+            help='Количество постов.'
+        )
+        parser.add_argument(
+            '--comments', type=int, default=50000,
+            help='Количество комментариев.'
+        )
+        parser.add_argument(
+            '--followings', type=int, default=20,
+            help='Среднее количество подписок пользователя на авторов.'
+        )
+        parser.add_argument(
+            '--group-follows', type=int, default=3,
+            help='Среднее количество избранных групп пользователя.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество объектов в одном INSERT.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество процессов, создающих посты и комментарии '
+                 '(для SQLite всегда 1).'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Начальное значение генератора случайных чисел.'
+        )
+
+    def handle(self, *args, **options):
+        start = monotonic()
+        seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            followings=options['followings'],
+            group_follows=options['group_follows'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            random_seed=options['seed'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {monotonic() - start:.1f} с.'
+        ))
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management import BaseCommand
+from posts.thumbnails import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие миниатюры всех изображений постов, '
+        'например после изменения POST_THUMBNAIL_SIZES или '
+        'восстановления media, и выводит статистику в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество процессов, создающих миниатюры.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать и уже готовые миниатюры.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только подсчитать изображения без миниатюр.'
+        )
+        parser.add_argument(
+            '--progress', default=None,
+            help='Файл с позицией обработки: прерванный запуск '
+                 'с тем же файлом продолжается с места остановки.'
+        )
+
+    def handle(self, *args, **options):
+        stats = warm_up(
+            workers=options['workers'],
+            force=options['force'],
+            dry_run=options['dry_run'],
+            progress=options['progress'],
+            log=self.stdout.write
+        )
+        self.stdout.write(json.dumps(stats, indent=2))
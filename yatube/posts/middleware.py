@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import get_language
+from posts.cache import PAGES, get_version
+
+
+class AnonymousPageCacheMiddleware:
+    """Кеширует целиком ответы представлений, помеченных
+    cache_for_anonymous, для запросов без сессии.
+
+    Стоит до SessionMiddleware: попадание отдается без обращения к базе.
+    Ключ - путь с параметрами, язык и версия PAGES, которую увеличивают
+    изменения постов, комментариев и подписок. Ответы, устанавливающие
+    cookie или использующие CSRF-токен, не кешируются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_anonymous(request):
+            return self.get_response(request)
+        key = self.cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return response
+        response = self.get_response(request)
+        if self.is_cacheable(request, response):
+            cache.set(key, response, settings.ANONYMOUS_CACHE_TIMEOUT)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.cache_for_anonymous = getattr(
+            view_func, 'cache_for_anonymous', False)
+
+    @staticmethod
+    def is_anonymous(request):
+        return request.method == 'GET' and not (
+            settings.SESSION_COOKIE_NAME in request.COOKIES
+            or 'messages' in request.COOKIES
+        )
+
+    @staticmethod
+    def cache_key(request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'anonymous_page:{get_version(PAGES)}:{get_language()}:{path}'
+
+    @staticmethod
+    def is_cacheable(request, response):
+        return (
+            getattr(request, 'cache_for_anonymous', False)
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(**{field: models.OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(total=models.Count('pk')).values('total'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    GroupFollow = apps.get_model('posts', 'GroupFollow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=row.pop('pk'), **row)
+         for row in User.objects.values(
+             'pk',
+             posts_count=count_subquery(Post, 'author'),
+             comments_count=count_subquery(Comment, 'author'),
+             followers_count=count_subquery(Follow, 'author'),
+             followings_count=count_subquery(Follow, 'user'),
+             group_follows_count=count_subquery(GroupFollow, 'user'),
+         ).iterator()),
+        batch_size=1000
+    )
+    Group.objects.update(
+        posts_count=count_subquery(Post, 'group'),
+        followers_count=count_subquery(GroupFollow, 'group'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('followings_count', models.PositiveIntegerField(default=0, verbose_name='Подписок на авторов')),
+                ('group_follows_count', models.PositiveIntegerField(default=0, verbose_name='Подписок на сообщества')),
+            ],
+            options={
+                'verbose_name': 'Счетчики пользователя',
+                'verbose_name_plural': 'Счетчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Постов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
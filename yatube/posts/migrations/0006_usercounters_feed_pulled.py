@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    # Посты этих авторов уже читались из таблицы постов и записей ленты
+    # не имеют.
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_image_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='feed_pulled',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются в ленту из таблицы постов'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,44 @@
+from datetime import timedelta
+from itertools import islice
+
 from core.models import CreatedFieldModel
+from core.streams import MergedStreams
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 User = get_user_model()
 
+FEED_BATCH_SIZE = 1000
+# Запас на посты, опубликованные во время перевода автора в режим push.
+FEED_PUSH_MARGIN = timedelta(minutes=5)
+
+
+def count_subquery(model, field):
+    """Коррелированный подзапрос COUNT(*) объектов model по внешнему
+    ключу field. В отличие от Count() не требует GROUP BY по всей выборке
+    и вычисляется только для попавших на страницу строк."""
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(**{field: models.OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=models.Count('pk'))
+            .values('total'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
 
 class Group(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     slug = models.SlugField('Идентификатор', unique=True)
     description = models.TextField('Описание')
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
 
     class Meta:
         verbose_name = 'Группа'
@@ -18,6 +48,28 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор с его счетчиками, группа и количество
+        комментариев (comments_count) загружаются одним запросом."""
+        return self.select_related(
+            'author', 'author__counters', 'group'
+        ).annotate(comments_count=count_subquery(Comment, 'post'))
+
+    def for_entries(self, entries):
+        """Посты записей ленты entries в порядке записей."""
+        posts = self.in_bulk([entry.post_id for entry in entries])
+        return [
+            posts[entry.post_id] for entry in entries
+            if entry.post_id in posts
+        ]
+
+    def bulk_create(self, objs, *args, **kwargs):
+        posts = super().bulk_create(objs, *args, **kwargs)
+        FeedEntry.objects.fan_out(posts)
+        return posts
+
+
 class Post(CreatedFieldModel):
     STR_METHOD_TEMPLATE = (
         '{group}, '
@@ -50,9 +102,29 @@ class Post(CreatedFieldModel):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta(CreatedFieldModel.Meta):
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['created', 'id'],
+                name='post_created_idx'
+            ),
+            models.Index(
+                fields=['author', 'created', 'id'],
+                name='post_author_created_idx'
+            ),
+            models.Index(
+                fields=['group', 'created', 'id'],
+                name='post_group_created_idx'
+            ),
+            models.Index(
+                fields=['image'],
+                name='post_image_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.STR_METHOD_TEMPLATE.format(
@@ -84,6 +156,16 @@ class Comment(CreatedFieldModel):
     class Meta(CreatedFieldModel.Meta):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['author', 'created', 'id'],
+                name='comment_author_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -113,6 +195,12 @@ class Follow(models.Model):
                 name='no_self_follow'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
 
 
 class GroupFollow(models.Model):
@@ -138,3 +226,218 @@ class GroupFollow(models.Model):
                 name='group_unique_follow'
             )
         ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счетчики пользователя.
+
+    Обновляются в представлениях, изменяющих данные, и пересчитываются
+    командой recount_counters. Отсутствие записи означает нулевые счетчики.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    followings_count = models.PositiveIntegerField(
+        'Подписок на авторов',
+        default=0
+    )
+    group_follows_count = models.PositiveIntegerField(
+        'Подписок на сообщества',
+        default=0
+    )
+    feed_pulled = models.BooleanField(
+        'Посты читаются в ленту из таблицы постов',
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def insert(self, entries):
+        """Вставляет записи пачками, не держа в памяти весь поток."""
+        entries = iter(entries)
+        while True:
+            batch = list(islice(entries, FEED_BATCH_SIZE))
+            if not batch:
+                return
+            self.bulk_create(batch, ignore_conflicts=True)
+
+    def fan_out(self, posts):
+        """Добавляет посты в ленты подписчиков их авторов.
+        Посты авторов в режиме pull не раскладываются: они читаются
+        из таблицы постов при показе ленты (см. timeline)."""
+        posts = [post for post in posts if post.pk is not None]
+        authors = {post.author_id for post in posts} - set(
+            UserCounters.objects.filter(
+                user__in={post.author_id for post in posts},
+                feed_pulled=True
+            ).values_list('user', flat=True)
+        )
+        followers = {}
+        for user_id, author_id in Follow.objects.filter(
+                author__in=authors).values_list('user', 'author'):
+            followers.setdefault(author_id, []).append(user_id)
+        self.insert(
+            FeedEntry(user_id=user_id,
+                      post_id=post.pk,
+                      author_id=post.author_id,
+                      created=post.created)
+            for post in posts
+            for user_id in followers.get(post.author_id, ())
+        )
+
+    def copy(self, author, posts, users):
+        """Добавляет posts автора author в ленты users."""
+        posts = list(posts.values_list('pk', 'created'))
+        self.insert(
+            FeedEntry(user_id=user_id,
+                      post_id=post_id,
+                      author_id=author,
+                      created=created)
+            for user_id in users
+            for post_id, created in posts
+        )
+
+    def backfill(self, user, author):
+        """Добавляет в ленту user все посты author. Вызывается
+        до увеличения счетчика подписчиков: автор, который с новым
+        подписчиком станет популярным, сразу переводится в режим pull,
+        и его посты не копируются."""
+        if UserCounters.objects.filter(
+            user=author,
+            followers_count__gte=settings.FEED_FANOUT_THRESHOLD
+        ).update(feed_pulled=True):
+            return
+        self.copy(author.pk, Post.objects.filter(author=author), [user.pk])
+
+    def pull(self):
+        """Переводит в режим pull авторов, у которых подписчиков больше
+        FEED_FANOUT_THRESHOLD. Возвращает количество переведенных."""
+        return UserCounters.objects.filter(
+            feed_pulled=False,
+            followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+        ).update(feed_pulled=True)
+
+    def push(self):
+        """Переводит обратно в режим push авторов, у которых подписчиков
+        не больше FEED_PUSH_THRESHOLD. Возвращает количество переведенных.
+
+        Пока автор в режиме pull, timeline читает его посты из таблицы
+        постов, поэтому ленты заполняются в фоне (команда rebalance_feeds),
+        а не при отписке. Разрыв между порогами не дает подпискам
+        и отпискам около FEED_FANOUT_THRESHOLD повторять эту работу.
+        Посты, опубликованные во время заполнения, когда fan_out еще
+        пропускал автора, копируются повторно после снятия флага."""
+        authors = list(UserCounters.objects.filter(
+            feed_pulled=True,
+            followers_count__lte=min(settings.FEED_PUSH_THRESHOLD,
+                                     settings.FEED_FANOUT_THRESHOLD)
+        ).values_list('user', flat=True))
+        for author in authors:
+            since = timezone.now() - FEED_PUSH_MARGIN
+            followers = Follow.objects.filter(
+                author=author).values_list('user', flat=True)
+            posts = Post.objects.filter(author=author)
+            self.copy(author, posts, followers.iterator())
+            UserCounters.objects.filter(user=author).update(feed_pulled=False)
+            self.copy(
+                author, posts.filter(created__gte=since), followers.iterator())
+        return len(authors)
+
+    def prune(self, user, author):
+        """Удаляет из ленты user посты author."""
+        self.filter(user=user, author=author).delete()
+
+    def timeline(self, user):
+        """Лента подписок user, упорядоченная по (created, post_id).
+
+        Посты обычных авторов берутся из записей ленты (push), посты
+        авторов с флагом feed_pulled - прямо из таблицы постов (pull)
+        одним запросом по индексу
+        (author, created), посты избранных групп - одним запросом
+        по индексу (group, created). Потоки не пересекаются и сливаются
+        по дате создания.
+        """
+        entries = self.filter(user=user)
+        pulled = list(Follow.objects.filter(
+            user=user,
+            author__counters__feed_pulled=True
+        ).values_list('author', flat=True))
+        groups = list(GroupFollow.objects.filter(
+            user=user).values_list('group', flat=True))
+        if not pulled and not groups:
+            return entries
+        posts = Post.objects.annotate(post_id=models.F('pk')).only('created')
+        streams = [entries.exclude(author__in=pulled).only('created', 'post')]
+        if pulled:
+            streams.append(posts.filter(author__in=pulled))
+        if groups:
+            streams.append(
+                posts.filter(group__in=groups)
+                .exclude(author=user)
+                .exclude(author__following__user=user)
+            )
+        return MergedStreams(
+            streams,
+            keys=('created', 'post_id'),
+            model=FeedEntry
+        ).order_by('-created', '-post_id')
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок (fan-out on write).
+
+    Лента пользователя читается диапазоном по индексу (user, created)
+    без соединения Follow и Post. created и author копируются из поста.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель ленты'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-created', '-post_id')
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='feed_entry_user_created_idx'
+            )
+        ]
@@ -0,0 +1,248 @@
+"""Генерация синтетических данных для нагрузочного тестирования.
+
+Объекты создаются потоково, пачками через bulk_create: в памяти
+держатся только первичные ключи пользователей и групп и одна пачка.
+Популярность авторов подчиняется степенному закону (закон Ципфа):
+на немногих авторов подписано большинство пользователей, и они же
+пишут большую часть постов.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+from multiprocessing import Pool
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, models
+from django.utils import timezone
+from faker import Faker
+from posts.counters import recount_groups, recount_users
+from posts.models import (Comment, FeedEntry, Follow, Group, GroupFollow, Post,
+                          User, UserCounters)
+
+BATCH_SIZE = 5000
+PASSWORD = 'password'
+TEXTS_POOL_SIZE = 1000
+PERIOD = timedelta(days=365)
+
+# Состояние процесса-генератора постов (см. _init_worker).
+_context = {}
+
+
+def batches(objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def power_law_counts(total, size, rng):
+    """Разбивает total на size слагаемых с распределением Парето."""
+    weights = [rng.paretovariate(2) for _ in range(size)]
+    scale = total / sum(weights)
+    return [round(weight * scale) for weight in weights]
+
+
+def zipf_cum_weights(size):
+    """Накопленные веса закона Ципфа для random.choices."""
+    return list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+@contextmanager
+def explicit_created(*model_classes):
+    """Позволяет задавать created явно: auto_now_add иначе
+    перезаписывает его текущим временем при вставке."""
+    fields = [model._meta.get_field('created') for model in model_classes]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def create_users(count, batch_size, fake):
+    password = make_password(PASSWORD)
+    start = User.objects.count()
+    for batch in batches(
+        (User(username=f'{fake.user_name()}{start + index}',
+              first_name=fake.first_name(),
+              last_name=fake.last_name(),
+              password=password)
+         for index in range(count)),
+        batch_size
+    ):
+        User.objects.bulk_create(batch)
+
+
+def create_groups(count, batch_size, fake):
+    start = Group.objects.count()
+    for batch in batches(
+        (Group(title=fake.catch_phrase()[:200],
+               slug=f'group-{start + index}',
+               description=fake.paragraph())
+         for index in range(count)),
+        batch_size
+    ):
+        Group.objects.bulk_create(batch)
+
+
+def generate_follows(users, followings, rng):
+    authors = users[:]
+    rng.shuffle(authors)
+    weights = zipf_cum_weights(len(authors))
+    for user, count in zip(users, power_law_counts(
+            followings * len(users), len(users), rng)):
+        chosen = set(rng.choices(
+            authors, cum_weights=weights, k=min(count, len(authors) - 1)))
+        chosen.discard(user)
+        for author in chosen:
+            yield Follow(user_id=user, author_id=author)
+
+
+def generate_group_follows(users, groups, count, rng):
+    weights = zipf_cum_weights(len(groups))
+    for user, count in zip(users, power_law_counts(
+            count * len(users), len(users), rng)):
+        for group in set(rng.choices(
+                groups, cum_weights=weights, k=min(count, len(groups)))):
+            yield GroupFollow(user_id=user, group_id=group)
+
+
+def create_follows(users, groups, followings, group_followings, batch_size,
+                   rng):
+    """Подписки на авторов и группы. Число подписок пользователя
+    распределено по Парето, авторы и группы выбираются по Ципфу."""
+    if not users:
+        return
+    for batch in batches(generate_follows(users, followings, rng), batch_size):
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+    if not groups:
+        return
+    for batch in batches(
+            generate_group_follows(users, groups, group_followings, rng),
+            batch_size):
+        GroupFollow.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post_ids):
+    """То же, что FeedEntryQuerySet.fan_out, но одним INSERT ... SELECT
+    без создания объектов: на миллионах записей ленты это на порядок
+    быстрее bulk_create."""
+    feed, post, follow, counters = (
+        model._meta.db_table
+        for model in (FeedEntry, Post, Follow, UserCounters)
+    )
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {feed} (user_id, post_id, author_id, created) '
+            f'SELECT f.user_id, p.id, p.author_id, p.created '
+            f'FROM {post} p '
+            f'JOIN {follow} f ON f.author_id = p.author_id '
+            f'LEFT JOIN {counters} c ON c.user_id = p.author_id '
+            f'WHERE p.id IN ({placeholders}) '
+            f'AND (c.feed_pulled IS NULL OR NOT c.feed_pulled)',
+            post_ids
+        )
+
+
+def _init_worker(context):
+    _context.update(context)
+
+
+def create_posts(task):
+    """Создает пачку постов и комментарии к ним. Выполняется и в
+    отдельных процессах: ключи комментируемых постов берутся из ответа
+    bulk_create, а не из общей памяти."""
+    posts_count, comments_count, seed = task
+    rng = random.Random(seed)
+    users = _context['users']
+    groups = _context['groups']
+    texts = _context['texts']
+    now = timezone.now()
+    with explicit_created(Post, Comment):
+        # Базовый bulk_create: ленты заполняет fan_out ниже.
+        posts = models.QuerySet(Post).bulk_create(
+            Post(text=rng.choice(texts),
+                 author_id=rng.choices(
+                     users, cum_weights=_context['author_weights'])[0],
+                 group_id=(
+                     rng.choice(groups)
+                     if groups and rng.random() < 0.5 else None),
+                 created=now - PERIOD * rng.random())
+            for _ in range(posts_count)
+        )
+        fan_out([post.pk for post in posts])
+        Comment.objects.bulk_create(
+            Comment(text=rng.choice(texts),
+                    author_id=rng.choice(users),
+                    post_id=post.pk,
+                    created=post.created + (now - post.created)
+                    * rng.random())
+            for post in rng.choices(posts, k=comments_count)
+        )
+    return posts_count
+
+
+def seed(users=1000, groups=50, posts=10000, comments=50000,
+         followings=20, group_follows=3, batch_size=BATCH_SIZE, workers=1,
+         random_seed=None, log=None):
+    """Создает заданные объемы данных и пересчитывает счетчики.
+    log - функция для вывода хода работы."""
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    log(f'Пользователи: {users}')
+    create_users(users, batch_size, fake)
+    log(f'Группы: {groups}')
+    create_groups(groups, batch_size, fake)
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    group_ids = list(
+        Group.objects.order_by('pk').values_list('pk', flat=True))
+    log('Подписки')
+    create_follows(user_ids, group_ids, followings, group_follows,
+                   batch_size, rng)
+    # Счетчики подписчиков нужны до создания постов: посты популярных
+    # авторов не раскладываются по лентам (см. FeedEntryQuerySet.fan_out).
+    recount_users(batch_size=batch_size)
+    FeedEntry.objects.pull()
+    if not user_ids:
+        return
+    log(f'Посты: {posts}, комментарии: {comments}')
+    authors = user_ids[:]
+    rng.shuffle(authors)
+    context = {
+        'users': authors,
+        'groups': group_ids,
+        'texts': [fake.paragraph() for _ in range(TEXTS_POOL_SIZE)],
+        'author_weights': zipf_cum_weights(len(authors)),
+    }
+    tasks = [
+        (
+            min(batch_size, posts - start),
+            (comments * min(start + batch_size, posts) // posts
+             - comments * start // posts),
+            rng.random()
+        )
+        for start in range(0, posts, batch_size)
+    ]
+    if connection.vendor == 'sqlite':
+        # SQLite не допускает параллельной записи.
+        workers = 1
+    if workers > 1:
+        connections.close_all()
+        with Pool(workers, _init_worker, (context,)) as pool:
+            for done in pool.imap_unordered(create_posts, tasks):
+                log(f'  +{done}')
+    else:
+        _init_worker(context)
+        for task in tasks:
+            log(f'  +{create_posts(task)}')
+    log('Счетчики')
+    recount_users(batch_size=batch_size)
+    recount_groups(batch_size=batch_size)
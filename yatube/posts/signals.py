@@ -0,0 +1,42 @@
+from core.storage import release
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from posts.follows import invalidate_follow_set
+from posts.models import FeedEntry, Follow, GroupFollow, Post
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора."""
+    if created:
+        FeedEntry.objects.fan_out([instance])
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Посты автора попадают в ленту нового подписчика."""
+    if created:
+        FeedEntry.objects.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    """Посты автора удаляются из ленты отписавшегося."""
+    FeedEntry.objects.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@receiver(post_save, sender=GroupFollow)
+@receiver(post_delete, sender=GroupFollow)
+def reset_follow_set(sender, instance, **kwargs):
+    """Набор подписок пользователя перечитывается после фиксации
+    транзакции: иначе параллельный запрос закешировал бы старый."""
+    transaction.on_commit(lambda: invalidate_follow_set(instance.user_id))
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    """Освобождает ссылку на изображение удаленного поста."""
+    release(instance.image.storage, instance.image.name)
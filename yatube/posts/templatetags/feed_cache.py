@@ -0,0 +1,50 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+from posts.cache import get_or_compute
+
+register = template.Library()
+
+
+class FeedCacheNode(CacheNode):
+    def render(self, context):
+        try:
+            timeout = self.expire_time_var.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                f'"feed_cache" tag got an unknown variable: '
+                f'{self.expire_time_var.var!r}'
+            )
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on]
+        )
+        return get_or_compute(
+            key,
+            lambda: self.nodelist.render(context),
+            None if timeout is None else int(timeout)
+        )
+
+
+@register.tag
+def feed_cache(parser, token):
+    """Как {% cache %}, но с защитой от одновременного пересчета
+    (см. posts.cache.get_or_compute):
+
+        {% feed_cache timeout fragment_name [var1] [var2] ... %}
+            ...
+        {% endfeed_cache %}
+    """
+    nodelist = parser.parse(('endfeed_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.')
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        None
+    )
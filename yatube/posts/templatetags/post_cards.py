@@ -0,0 +1,59 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+from posts.thumbnails import responsive_thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/views/post_view.html'
+
+
+def card_version(post):
+    """Версия карточки - хеш всех показываемых в ней данных. Меняется
+    при редактировании поста, новом комментарии, изменении счетчиков
+    автора и группы, поэтому карточки не нужно сбрасывать явно."""
+    author = post.author
+    counters = getattr(author, 'counters', None)
+    group = post.group
+    values = (
+        post.text, post.image.name, post.created,
+        getattr(post, 'comments_count', None),
+        author.username, author.get_full_name(),
+        counters and (counters.posts_count, counters.comments_count),
+        group and (group.slug, group.title, group.posts_count),
+    )
+    return hashlib.md5(repr(values).encode()).hexdigest()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, **flags):
+    """Список HTML карточек постов posts. Готовые карточки читаются
+    из кеша одним get_many, рендерятся только промахи.
+    flags (no_post_info, no_profile_info, no_group_info) передаются
+    в шаблон карточки и входят в ключ. Миниатюры карточек-промахов
+    читаются вместе (см. responsive_thumbnails); карточки с заглушкой
+    вместо миниатюры не кешируются."""
+    variant = ','.join(sorted(name for name, value in flags.items() if value))
+    keys = {
+        f'post_card:{variant}:{post.pk}:{card_version(post)}': post
+        for post in posts
+    }
+    cards = cache.get_many(keys)
+    pictures = responsive_thumbnails(
+        post.image for key, post in keys.items() if key not in cards)
+    missed = {}
+    card_template = context.template.engine.get_template(CARD_TEMPLATE)
+    for key, post in keys.items():
+        if key not in cards:
+            post_pictures = pictures.get(post.image.name)
+            with context.push(
+                    post=post, post_pictures=post_pictures, **flags):
+                cards[key] = card_template.render(context)
+            if not post.image or post_pictures is not None:
+                missed[key] = cards[key]
+    if missed:
+        cache.set_many(missed, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,20 @@
+from django import template
+from posts.thumbnails import responsive_thumbnails, schedule_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image, geometry):
+    """Готовая миниатюра image с вариантами для srcset
+    (см. responsive_thumbnails) или None. Если миниатюры еще нет,
+    ее создание ставится в очередь, а шаблон показывает заглушку.
+    post_cards передает миниатюры всех карточек в post_pictures."""
+    if 'post_pictures' in context:
+        pictures = context['post_pictures']
+    else:
+        pictures = responsive_thumbnails([image])[image.name]
+    if pictures is None:
+        schedule_thumbnails(image)
+        return None
+    return pictures[geometry]
@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.test import TestCase
+from posts.benchmark import benchmark, compare
+
+VOLUMES = dict(users=10, groups=2, posts=30, comments=40)
+PAGES = ('index', 'authors', 'groups', 'follow_index', 'profile',
+         'group_posts', 'post_detail')
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_memory_kb')
+
+
+class BenchmarkTest(TestCase):
+    def test_benchmark_reports_metrics(self):
+        """Замер возвращает метрики всех страниц."""
+        results = benchmark(VOLUMES, repeat=2, random_seed=1)
+        self.assertEqual(tuple(results), PAGES)
+        for name, metrics in results.items():
+            with self.subTest(page=name):
+                self.assertEqual(metrics['status'], 200)
+                for key in METRICS:
+                    self.assertIn(key, metrics)
+                self.assertGreater(metrics['queries'], 0)
+
+    def test_benchmark_does_not_touch_cache(self):
+        """Замер не очищает и не наполняет кеш приложения."""
+        cache.set('live', 1)
+        benchmark(VOLUMES, repeat=2, random_seed=1)
+        self.assertEqual(cache.get('live'), 1)
+        self.assertEqual(len(cache._cache), 1)
+
+    def test_compare_with_baseline(self):
+        """Сравнение с базовым прогоном дает изменение в процентах."""
+        metrics = {'p50_ms': 15.0, 'p95_ms': 20.0}
+        compare(
+            {'small': {'index': metrics}},
+            {'small': {'index': {'p50_ms': 10.0, 'p95_ms': 0}}}
+        )
+        self.assertEqual(metrics['p50_ms_change_percent'], 50.0)
+        self.assertNotIn('p95_ms_change_percent', metrics)
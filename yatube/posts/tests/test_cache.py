@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+from posts.cache import (FEED, STALE_TIMEOUT, bump_version, get_or_compute,
+                         get_version)
+from posts.models import Post, User
+
+KEY = 'key'
+TIMEOUT = 60
+INDEX_URL = reverse('posts:index')
+PROFILE_URL = reverse('posts:profile', args=['author'])
+
+
+class GetOrComputeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='new')
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Свежее значение берется из кеша."""
+        self.assertEqual(get_or_compute(KEY, self.compute, TIMEOUT), 'new')
+        self.assertEqual(get_or_compute(KEY, self.compute, TIMEOUT), 'new')
+        self.compute.assert_called_once()
+
+    def test_stale_value_is_served_while_locked(self):
+        """Пока другой процесс пересчитывает значение, отдается
+        устаревшее; освободившаяся блокировка позволяет пересчет."""
+        cache.set(KEY, ('old', 0), TIMEOUT + STALE_TIMEOUT)
+        cache.add(f'lock:{KEY}', 1)
+        self.assertEqual(get_or_compute(KEY, self.compute, TIMEOUT), 'old')
+        self.compute.assert_not_called()
+        cache.delete(f'lock:{KEY}')
+        self.assertEqual(get_or_compute(KEY, self.compute, TIMEOUT), 'new')
+        self.assertEqual(get_or_compute(KEY, self.compute, TIMEOUT), 'new')
+        self.compute.assert_called_once()
+
+    @mock.patch('posts.cache.LOCK_WAIT', 0.2)
+    def test_miss_waits_for_other_computation(self):
+        """При промахе во время чужого пересчета значение ждут,
+        а по истечении ожидания вычисляют сами."""
+        cache.add(f'lock:{KEY}', 1)
+
+        def sleep(seconds):
+            cache.set(KEY, ('other', None))
+
+        with mock.patch('posts.cache.time.sleep', sleep):
+            self.assertEqual(
+                get_or_compute(KEY, self.compute, TIMEOUT), 'other')
+        cache.delete(KEY)
+        self.assertEqual(get_or_compute(KEY, self.compute, TIMEOUT), 'new')
+        self.assertIsNone(cache.get(KEY))
+
+    def test_bump_version(self):
+        """Версия растет и не сбрасывается к прежним значениям."""
+        version = get_version(FEED)
+        bump_version(FEED)
+        self.assertEqual(get_version(FEED), version + 1)
+        cache.clear()
+        with mock.patch('posts.cache.time.time_ns',
+                        return_value=(version + 2) * 1000000):
+            bump_version(FEED)
+        self.assertGreater(get_version(FEED), version + 1)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(text='Первый пост', author=cls.author)
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.user_client = Client()
+        cls.user_client.force_login(cls.user)
+
+    def test_anonymous_hit_does_not_touch_database(self):
+        """Повторный анонимный запрос отдается из кеша без запросов
+        к базе, авторизованный пользователь кешем не пользуется."""
+        self.client.get(INDEX_URL)
+        with self.assertNumQueries(0):
+            response = self.client.get(INDEX_URL)
+        self.assertContains(response, 'Первый пост')
+        Post.objects.create(text='Второй пост', author=self.author)
+        self.assertNotContains(self.client.get(INDEX_URL), 'Второй пост')
+        self.assertContains(self.author_client.get(INDEX_URL), 'Второй пост')
+
+    def test_writes_invalidate_anonymous_pages(self):
+        """Новый пост и подписка сбрасывают кеш страниц."""
+        self.client.get(INDEX_URL)
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Второй пост'})
+        self.assertContains(self.client.get(INDEX_URL), 'Второй пост')
+        content = self.client.get(PROFILE_URL).content
+        self.user_client.get(reverse('posts:profile_follow', args=['author']))
+        self.assertNotEqual(content, self.client.get(PROFILE_URL).content)
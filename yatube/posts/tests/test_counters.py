@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+
+SLUG = 'Test-slug'
+USERNAME = 'author'
+CREATE_URL = reverse('posts:post_create')
+PROFILE_FOLLOW_URL = reverse('posts:profile_follow', args=[USERNAME])
+PROFILE_UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[USERNAME])
+GROUP_FOLLOW_URL = reverse('posts:group_follow', args=[SLUG])
+GROUP_UNFOLLOW_URL = reverse('posts:group_unfollow', args=[SLUG])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+            description='Тестовое описание'
+        )
+        cls.user_client = Client()
+        cls.author_client = Client()
+        cls.user_client.force_login(cls.user)
+        cls.author_client.force_login(cls.author)
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Создание и удаление поста и комментария меняют счетчики."""
+        self.author_client.post(
+            CREATE_URL, data={'text': 'Тестовый пост', 'group': self.group.pk})
+        post = Post.objects.get()
+        self.user_client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            data={'text': 'Текст комментария'})
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.user).comments_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.author_client.post(reverse('posts:post_delete', args=[post.pk]))
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.counters(self.user).comments_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики подписок."""
+        for url, expected in (
+            (PROFILE_FOLLOW_URL, 1),
+            (PROFILE_FOLLOW_URL, 1),
+            (PROFILE_UNFOLLOW_URL, 0),
+        ):
+            with self.subTest(url=url):
+                self.user_client.get(url)
+                self.assertEqual(
+                    self.counters(self.author).followers_count, expected)
+                self.assertEqual(
+                    self.counters(self.user).followings_count, expected)
+
+    def test_group_follow_counters(self):
+        """Подписка и отписка от группы меняют счетчики."""
+        for url, expected in (
+            (GROUP_FOLLOW_URL, 1),
+            (GROUP_FOLLOW_URL, 1),
+            (GROUP_UNFOLLOW_URL, 0),
+        ):
+            with self.subTest(url=url):
+                self.user_client.get(url)
+                self.group.refresh_from_db()
+                self.assertEqual(self.group.followers_count, expected)
+                self.assertEqual(
+                    self.counters(self.user).group_follows_count, expected)
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters исправляет расхождения счетчиков."""
+        post = Post.objects.create(author=self.author, group=self.group)
+        Comment.objects.create(author=self.user, post=post)
+        Follow.objects.create(user=self.user, author=self.author)
+        UserCounters.objects.create(user=self.author, posts_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        author_counters = self.counters(self.author)
+        self.assertEqual(author_counters.posts_count, 1)
+        self.assertEqual(author_counters.followers_count, 1)
+        user_counters = self.counters(self.user)
+        self.assertEqual(user_counters.comments_count, 1)
+        self.assertEqual(user_counters.followings_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
@@ -0,0 +1,208 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import FeedEntry, Group, Post, User, UserCounters
+
+from yatube.settings import POSTS_PER_PAGE
+
+USERNAME = 'author'
+CREATE_URL = reverse('posts:post_create')
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+PROFILE_FOLLOW_URL = reverse('posts:profile_follow', args=[USERNAME])
+PROFILE_UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[USERNAME])
+
+
+class FeedEntryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+        cls.user_client = Client()
+        cls.author_client = Client()
+        cls.user_client.force_login(cls.user)
+        cls.author_client.force_login(cls.author)
+
+    def feed(self, client=None):
+        return list(
+            (client or self.user_client).get(
+                FOLLOW_INDEX_URL).context['page_obj'])
+
+    def rebalance_feeds(self):
+        out = StringIO()
+        call_command('rebalance_feeds', stdout=out)
+        return json.loads(out.getvalue())
+
+    def is_pulled(self):
+        return UserCounters.objects.get(user=self.author).feed_pulled
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка добавляет посты автора в ленту, отписка - удаляет."""
+        self.assertEqual(self.feed(), [])
+        self.user_client.get(PROFILE_FOLLOW_URL)
+        self.assertEqual(self.feed(), [self.post])
+        self.user_client.get(PROFILE_UNFOLLOW_URL)
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в начало ленты подписчиков."""
+        self.user_client.get(PROFILE_FOLLOW_URL)
+        self.author_client.post(CREATE_URL, data={'text': 'Новый пост'})
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertEqual(self.feed(), [new_post, self.post])
+        self.assertFalse(FeedEntry.objects.filter(user=self.author).exists())
+
+    def test_deleted_post_leaves_feed(self):
+        """Удаленный пост пропадает из ленты."""
+        self.user_client.get(PROFILE_FOLLOW_URL)
+        self.author_client.post(
+            reverse('posts:post_delete', args=[self.post.pk]))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_popular_author_posts_are_pulled(self):
+        """Посты популярного автора не раскладываются по лентам,
+        а подмешиваются в ленту при чтении без дублей."""
+        regular = User.objects.create_user(username='regular')
+        Post.objects.create(author=regular)
+        other_client = Client()
+        other_client.force_login(User.objects.create_user(username='other'))
+        for client in (self.user_client, other_client):
+            client.get(PROFILE_FOLLOW_URL)
+        self.user_client.get(
+            reverse('posts:profile_follow', args=[regular.username]))
+        self.author_client.post(CREATE_URL, data={'text': 'Новый пост'})
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        Post.objects.bulk_create(
+            Post(author=self.author) for _ in range(POSTS_PER_PAGE))
+        feed = list(Post.objects.order_by('-created', '-pk'))
+        first = self.user_client.get(FOLLOW_INDEX_URL).context['page_obj']
+        second = self.user_client.get(
+            FOLLOW_INDEX_URL, {'page': 2}).context['page_obj']
+        self.assertEqual(first.paginator.count, len(feed))
+        self.assertEqual(list(first) + list(second), feed)
+        with override_settings(CURSOR_PAGINATED_VIEWS=('follow_index',)):
+            first = self.user_client.get(
+                FOLLOW_INDEX_URL).context['page_obj']
+            second = self.user_client.get(
+                FOLLOW_INDEX_URL, {'cursor': first.next_cursor}
+            ).context['page_obj']
+        self.assertEqual(list(first) + list(second), feed)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1, FEED_PUSH_THRESHOLD=1)
+    def test_author_below_threshold_is_fanned_out(self):
+        """Отписка не заполняет ленты: посты автора, переставшего быть
+        популярным, читаются из таблицы постов, пока rebalance_feeds
+        не разложит их по лентам подписчиков."""
+        other_client = Client()
+        other_client.force_login(User.objects.create_user(username='other'))
+        for client in (self.user_client, other_client):
+            client.get(PROFILE_FOLLOW_URL)
+        self.author_client.post(CREATE_URL, data={'text': 'Новый пост'})
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        other_client.get(PROFILE_UNFOLLOW_URL)
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        self.assertTrue(self.is_pulled())
+        self.assertEqual(self.feed(), [new_post, self.post])
+        self.assertEqual(self.rebalance_feeds(), {'pulled': 0, 'pushed': 1})
+        self.assertFalse(self.is_pulled())
+        self.assertEqual(self.feed(), [new_post, self.post])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=2, FEED_PUSH_THRESHOLD=1)
+    def test_toggling_around_threshold_does_not_copy_posts(self):
+        """Подписки и отписки около порога не копируют посты автора;
+        он возвращается в режим push, только когда подписчиков
+        становится не больше FEED_PUSH_THRESHOLD, в том числе после
+        удаления подписчика каскадом."""
+        other_client = Client()
+        other = User.objects.create_user(username='other')
+        other_client.force_login(other)
+        third_client = Client()
+        third = User.objects.create_user(username='third')
+        third_client.force_login(third)
+        for client in (self.user_client, other_client, third_client):
+            client.get(PROFILE_FOLLOW_URL)
+        self.assertTrue(self.is_pulled())
+        entries = FeedEntry.objects.count()
+        for _ in range(3):
+            third_client.get(PROFILE_UNFOLLOW_URL)
+            third_client.get(PROFILE_FOLLOW_URL)
+            self.assertEqual(self.feed(third_client), [self.post])
+        self.assertEqual(FeedEntry.objects.count(), entries)
+        self.assertEqual(self.rebalance_feeds(), {'pulled': 0, 'pushed': 0})
+        self.assertTrue(self.is_pulled())
+        other.delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.rebalance_feeds(), {'pulled': 0, 'pushed': 0})
+        self.user_client.get(PROFILE_UNFOLLOW_URL)
+        self.assertEqual(self.rebalance_feeds(), {'pulled': 0, 'pushed': 1})
+        self.assertFalse(self.is_pulled())
+        self.assertTrue(FeedEntry.objects.filter(user=third).exists())
+        self.assertEqual(self.feed(third_client), [self.post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_recounted_popular_author_is_pulled(self):
+        """rebalance_feeds переводит в режим pull авторов, у которых
+        подписчиков стало больше порога в обход представлений."""
+        for username in ('other', 'third'):
+            self.author.following.create(
+                user=User.objects.create_user(username=username))
+        call_command('recount_counters', stdout=StringIO())
+        self.assertFalse(self.is_pulled())
+        self.assertEqual(self.rebalance_feeds(), {'pulled': 1, 'pushed': 0})
+        self.assertTrue(self.is_pulled())
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_pulled_authors_are_read_with_one_query(self):
+        """Число запросов ленты не зависит от числа популярных авторов,
+        а их посты не копируются в ленту нового подписчика."""
+        other_client = Client()
+        other_client.force_login(User.objects.create_user(username='other'))
+
+        def follow_popular_author(username):
+            author = User.objects.create_user(username=username)
+            Post.objects.create(author=author)
+            url = reverse('posts:profile_follow', args=[username])
+            for client in (other_client, self.user_client):
+                client.get(url)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.user_client.get(FOLLOW_INDEX_URL)
+            return len(queries)
+
+        follow_popular_author('popular-0')
+        one = count_queries()
+        for number in range(1, 4):
+            follow_popular_author(f'popular-{number}')
+        self.assertEqual(count_queries(), one)
+        self.assertEqual(len(self.feed()), 4)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_followed_groups_are_merged_into_feed(self):
+        """Посты избранных групп попадают в ленту подписок один раз."""
+        group = Group.objects.create(slug='group')
+        stranger = User.objects.create_user(username='stranger')
+        self.user_client.get(PROFILE_FOLLOW_URL)
+        self.user_client.get(reverse('posts:group_follow', args=['group']))
+        group_post = Post.objects.create(author=stranger, group=group)
+        author_group_post = Post.objects.create(
+            author=self.author, group=group)
+        Post.objects.create(author=self.user, group=group)
+        Post.objects.create(author=stranger)
+        page_obj = self.user_client.get(FOLLOW_INDEX_URL).context['page_obj']
+        self.assertEqual(
+            list(page_obj), [author_group_post, group_post, self.post])
+        self.assertEqual(page_obj.paginator.count, 3)
@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+from posts.follows import follow_set_key, get_follow_set
+from posts.models import Follow, Group, GroupFollow, User
+
+USERNAME = 'author'
+SLUG = 'group'
+AUTHORS_URL = reverse('posts:authors')
+GROUPS_URL = reverse('posts:groups')
+PROFILE_FOLLOW_URL = reverse('posts:profile_follow', args=[USERNAME])
+PROFILE_UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[USERNAME])
+GROUP_FOLLOW_URL = reverse('posts:group_follow', args=[SLUG])
+
+
+class FollowSetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(slug=SLUG)
+        cls.other_group = Group.objects.create(slug='other')
+        Follow.objects.create(user=cls.user, author=cls.other)
+        GroupFollow.objects.create(user=cls.user, group=cls.other_group)
+        cls.user_client = Client()
+        cls.user_client.force_login(cls.user)
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_follow_set_is_loaded_once(self):
+        """Подписки на авторов и группы загружаются одним запросом
+        и запоминаются в запросе и в кеше."""
+        request = self.request(self.user)
+        with self.assertNumQueries(1):
+            follow_set = get_follow_set(request)
+            self.assertIs(get_follow_set(request), follow_set)
+        self.assertEqual(follow_set.author_ids, {self.other.pk})
+        self.assertEqual(follow_set.group_ids, {self.other_group.pk})
+        self.assertTrue(follow_set.follows_author(self.other))
+        self.assertFalse(follow_set.follows_author(self.author))
+        self.assertTrue(follow_set.follows_group(self.other_group))
+        self.assertFalse(follow_set.follows_group(self.group))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_follow_set(self.request(self.user)).author_ids,
+                follow_set.author_ids)
+
+    def test_follow_set_is_reset_on_follow_and_unfollow(self):
+        """Подписка и отписка удаляют набор подписок из кеша."""
+        for url, following in (
+            (PROFILE_FOLLOW_URL, True),
+            (PROFILE_UNFOLLOW_URL, False),
+        ):
+            with self.subTest(url=url):
+                get_follow_set(self.request(self.user))
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.user_client.get(url)
+                self.assertIsNone(cache.get(follow_set_key(self.user.pk)))
+                self.assertEqual(
+                    get_follow_set(
+                        self.request(self.user)).follows_author(self.author),
+                    following
+                )
+
+    def test_lists_show_follow_state(self):
+        """Списки авторов и групп показывают кнопки подписки
+        без отдельного запроса на каждый элемент."""
+        for url, follow_url, unfollow_url in (
+            (AUTHORS_URL, PROFILE_FOLLOW_URL,
+             reverse('posts:profile_unfollow', args=[self.other.username])),
+            (GROUPS_URL, GROUP_FOLLOW_URL,
+             reverse('posts:group_unfollow', args=[self.other_group.slug])),
+        ):
+            with self.subTest(url=url):
+                response = self.user_client.get(url)
+                self.assertContains(response, follow_url)
+                self.assertContains(response, unfollow_url)
+        self.assertNotContains(self.client.get(AUTHORS_URL), 'Подписаться')
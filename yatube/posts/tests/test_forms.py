@@ -1,13 +1,17 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.forms import CommentForm, PostForm
 from posts.models import Comment, Group, Post, User
+from posts.thumbnails import thumbnails_ready
 
 from .utils import get_image, posts_assertEqual
 
@@ -134,6 +138,125 @@ class PostFormTests(TestCase):
         )
         self.assertNotIn(self.post, Post.objects.all())
 
+    def test_uploaded_image_is_normalized(self):
+        """Загруженное изображение уменьшается до POST_IMAGE_MAX_SIZE,
+        поворачивается по EXIF и сохраняется без метаданных
+        под исходным именем."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90 по часовой
+        exif[0x010F] = 'Phone'  # Make
+        file = BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(file, 'JPEG', exif=exif)
+        with override_settings(POST_IMAGE_MAX_SIZE=(100, 100)):
+            self.author_client.post(CREATE_URL, data={
+                'text': 'Фото с телефона',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', file.getvalue(), 'image/jpeg')
+            })
+        post = Post.objects.get(text='Фото с телефона')
+        self.assertEqual(post.image, f'{IMAGE_FOLDER}photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (67, 100))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_mpo_image_is_normalized(self):
+        """Из снимка в формате MPO сохраняется уменьшенный основной
+        кадр в JPEG без метаданных."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Phone'  # Make
+        file = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(
+            file, 'MPO', save_all=True, exif=exif,
+            append_images=[Image.new('RGB', (400, 300), 'blue')])
+        file.seek(0)
+        with Image.open(file) as image:
+            self.assertEqual((image.format, image.n_frames), ('MPO', 2))
+        with override_settings(POST_IMAGE_MAX_SIZE=(100, 100)):
+            self.author_client.post(CREATE_URL, data={
+                'text': 'Снимок MPO',
+                'image': SimpleUploadedFile(
+                    'mpo.jpg', file.getvalue(), 'image/jpeg')
+            })
+        post = Post.objects.get(text='Снимок MPO')
+        self.assertEqual(post.image, f'{IMAGE_FOLDER}mpo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(getattr(image, 'n_frames', 1), 1)
+            self.assertEqual(image.size, (100, 75))
+            self.assertEqual(dict(image.getexif()), {})
+            red, green, blue = image.getpixel((50, 37))
+            self.assertGreater(red, blue)
+
+    def test_broken_image_is_rejected(self):
+        """Обрезанный JPEG, который не удается перекодировать,
+        отклоняется с ошибкой формы."""
+        file = BytesIO()
+        Image.effect_noise((300, 200), 64).save(file, 'JPEG')
+        response = self.author_client.post(CREATE_URL, data={
+            'text': 'Обрезанное фото',
+            'image': SimpleUploadedFile(
+                'broken.jpg', file.getvalue()[:len(file.getvalue()) // 2],
+                'image/jpeg')
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.context['form'].has_error('image', 'invalid_image'))
+        self.assertFalse(Post.objects.filter(text='Обрезанное фото').exists())
+
+    def test_too_large_image_is_rejected(self):
+        """Слишком тяжелое или слишком большое по числу пикселей
+        изображение отклоняется с ошибкой формы."""
+        for setting, value, code in (
+            ('POST_IMAGE_MAX_UPLOAD_SIZE', 10, 'file_too_large'),
+            ('POST_IMAGE_MAX_PIXELS', 0, 'too_many_pixels'),
+        ):
+            with (self.subTest(setting=setting),
+                  override_settings(**{setting: value})):
+                form = PostForm(
+                    data={'text': 'Пост'},
+                    files={'image': get_image('large.gif', 'image/gif')}
+                )
+                self.assertFalse(form.is_valid())
+                self.assertTrue(form.has_error('image', code))
+
+    @override_settings(
+        STORAGES={
+            **settings.STORAGES,
+            'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+        },
+        THUMBNAIL_WORKERS=0
+    )
+    def test_content_addressed_images(self):
+        """В хранилище с адресацией по содержимому одинаковые
+        изображения постов хранятся одним файлом с миниатюрами,
+        а файл удаляется вместе с последней ссылкой на него."""
+        posts = []
+        for number in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.author_client.post(CREATE_URL, data={
+                    'text': f'Одинаковое изображение {number}',
+                    'image': get_image(f'same{number}.gif', 'image/gif'),
+                })
+            posts.append(
+                Post.objects.get(text=f'Одинаковое изображение {number}'))
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        self.assertTrue(thumbnails_ready(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(
+                reverse('posts:post_delete', args=[posts[0].pk]))
+        self.assertTrue(posts[1].image.storage.exists(name))
+        file = BytesIO()
+        Image.new('RGB', (2, 2), 'blue').save(file, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(
+                reverse('posts:post_edit', args=[posts[1].pk]),
+                data={'text': 'Новое изображение',
+                      'image': SimpleUploadedFile(
+                          'new.png', file.getvalue(), 'image/png')})
+        self.assertFalse(posts[1].image.storage.exists(name))
+
 # -----------Anonymous/Not_author------------------------
     def test_anonymous_create_post(self):
         """Попытка анонима создать пост."""
@@ -0,0 +1,44 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@skipUnless(
+    connection.vendor in ('sqlite', 'postgresql'),
+    'Планы запросов проверяются только для SQLite и PostgreSQL.'
+)
+class HotPathIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(slug='Test-slug')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group)
+        Comment.objects.create(author=cls.user, post=cls.post)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик предпочитает Seq Scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def test_hot_queries_use_indexes(self):
+        """Запросы лент, комментариев, подписок и проверка доступа
+        к изображениям используют индексы."""
+        for queryset, index in (
+            (Post.objects.for_feed(), 'post_created_idx'),
+            (self.author.posts.for_feed(), 'post_author_created_idx'),
+            (self.group.posts.for_feed(), 'post_group_created_idx'),
+            (self.post.comments.all(), 'comment_post_created_idx'),
+            (self.user.comments.all(), 'comment_author_created_idx'),
+            (User.objects.filter(follower__author=self.author),
+             'follow_author_user_idx'),
+            (self.user.feed_entries.all(), 'feed_entry_user_created_idx'),
+            (Post.objects.filter(image='posts/image.gif'), 'post_image_idx'),
+        ):
+            with self.subTest(index=index):
+                self.assertIn(index, queryset[:10].explain())
@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from core.middleware import QueryBudgetExceededError
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from posts import views
+from posts.models import Comment, Follow, Group, GroupFollow, Post, User
+from posts.thumbnails import create_thumbnails
+from posts.urls import app_name, urlpatterns
+
+from yatube.settings import POSTS_PER_PAGE
+
+from .utils import get_image
+
+INDEX_URL = reverse('posts:index')
+# Представления, которые при GET меняют состояние и не дают повторяемого
+# числа запросов.
+STATEFUL = ('profile_unfollow', 'group_unfollow')
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(slug='Test-slug')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group,
+            image=get_image('post.gif', 'image/gif'))
+        Follow.objects.create(user=cls.user, author=cls.author)
+        GroupFollow.objects.create(user=cls.user, group=cls.group)
+        cls.user_client = Client()
+        cls.user_client.force_login(cls.user)
+        cls.kwargs = {
+            'slug': cls.group.slug,
+            'username': cls.author.username,
+            'post_id': cls.post.pk,
+            'path': 'posts/missing.gif',
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, size, thumbnails=False):
+        """Добавляет size связанных объектов каждого вида, посты -
+        с изображениями, при thumbnails - и с готовыми миниатюрами."""
+        users = [
+            User.objects.create_user(username=f'user-{size}-{index}')
+            for index in range(size)
+        ]
+        for user in users:
+            Follow.objects.create(user=user, author=self.author)
+            Follow.objects.create(user=self.author, author=user)
+            GroupFollow.objects.create(user=user, group=self.group)
+            Group.objects.create(slug=f'group-{user.username}')
+            post = Post.objects.create(
+                text='Пост', author=self.author, group=self.group,
+                image=get_image(f'{user.username}.gif', 'image/gif'))
+            if thumbnails:
+                create_thumbnails(post.image.name)
+            Comment.objects.create(author=user, post=self.post)
+            Comment.objects.create(author=self.author, post=post)
+
+    def count_queries(self):
+        counts = {}
+        for pattern in urlpatterns:
+            if pattern.name in STATEFUL:
+                continue
+            url = reverse(
+                f'{app_name}:{pattern.name}',
+                kwargs={
+                    name: self.kwargs[name]
+                    for name in pattern.pattern.converters
+                }
+            )
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.user_client.get(url)
+            counts[url] = len(queries)
+        return counts
+
+    def assert_queries_do_not_depend_on_data_size(self, thumbnails):
+        self.seed(1, thumbnails)
+        small = self.count_queries()
+        self.seed(POSTS_PER_PAGE, thumbnails)
+        large = self.count_queries()
+        for url, count in large.items():
+            with self.subTest(url=url):
+                self.assertEqual(count, small[url])
+                self.assertLessEqual(count, resolve(url).func.query_budget)
+
+    def test_queries_do_not_depend_on_data_size(self):
+        """Число запросов каждой страницы не зависит от объема данных
+        и укладывается в бюджет представления, пока миниатюры
+        изображений еще создаются."""
+        self.assert_queries_do_not_depend_on_data_size(thumbnails=False)
+
+    def test_queries_do_not_depend_on_data_size_with_thumbnails(self):
+        """То же с готовыми миниатюрами изображений."""
+        self.assert_queries_do_not_depend_on_data_size(thumbnails=True)
+
+    @override_settings(DEBUG=True, QUERY_BUDGET_RAISE=False)
+    def test_exceeded_budget_is_logged(self):
+        """В режиме DEBUG превышение бюджета пишется в лог."""
+        with mock.patch.object(views.index, 'query_budget', 1):
+            with self.assertLogs('core.middleware', 'WARNING'):
+                self.user_client.get(INDEX_URL)
+
+    @override_settings(DEBUG=True, QUERY_BUDGET_RAISE=True)
+    def test_exceeded_budget_raises(self):
+        """При QUERY_BUDGET_RAISE превышение бюджета - ошибка."""
+        with mock.patch.object(views.index, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceededError):
+                self.user_client.get(INDEX_URL)
@@ -0,0 +1,32 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from posts.counters import recount_groups, recount_users
+from posts.models import (Comment, FeedEntry, Follow, Group, GroupFollow, Post,
+                          User)
+
+
+class SeedLoadDataTest(TestCase):
+    def test_seed_load_data(self):
+        """Команда seed_load_data создает заданные объемы данных,
+        ленты подписок и согласованные счетчики."""
+        call_command(
+            'seed_load_data', users=30, groups=5, posts=120, comments=300,
+            followings=5, group_follows=2, batch_size=50, seed=1,
+            stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(GroupFollow.objects.exists())
+        self.assertGreater(
+            Post.objects.dates('created', 'day').count(), 1)
+        self.assertEqual(
+            FeedEntry.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count()
+        )
+        self.assertEqual(recount_users(dry_run=True), 0)
+        self.assertEqual(recount_groups(dry_run=True), 0)
@@ -0,0 +1,201 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts.cache import FEED, get_version
+from posts.models import Post, User
+from posts.thumbnails import (generate_thumbnails, pending_key,
+                              ready_thumbnail, thumbnails_ready)
+
+from .utils import get_image
+
+CREATE_URL = reverse('posts:post_create')
+PLACEHOLDER = 'Изображение обрабатывается'
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_are_generated_after_create(self):
+        """Миниатюры создаются после сохранения поста, а до этого
+        страницы показывают заглушку и не создают их сами."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.author_client.post(CREATE_URL, data={
+                'text': 'Пост', 'image': get_image('small.gif', 'image/gif')
+            })
+        post = Post.objects.get()
+        url = reverse('posts:post_detail', args=[post.pk])
+        self.assertFalse(thumbnails_ready(post.image))
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            self.assertContains(self.author_client.get(url), PLACEHOLDER)
+            get_thumbnail.assert_not_called()
+        version = get_version(FEED)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(thumbnails_ready(post.image))
+        self.assertGreater(get_version(FEED), version)
+        self.assertNotContains(self.author_client.get(url), PLACEHOLDER)
+
+    def test_thumbnails_have_modern_format_variants(self):
+        """Миниатюры выводятся в <picture> с вариантами WebP и AVIF
+        нескольких ширин без увеличения исходного изображения;
+        в ленте изображения загружаются лениво."""
+        file = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(file, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(CREATE_URL, data={
+                'text': 'Пост',
+                'image': SimpleUploadedFile(
+                    'large.png', file.getvalue(), 'image/png')
+            })
+        post = Post.objects.get()
+        response = self.author_client.get(
+            reverse('posts:post_detail', args=[post.pk]))
+        for type_ in ('image/webp', 'image/avif'):
+            with self.subTest(type=type_):
+                self.assertContains(response, f'<source type="{type_}"')
+        for width in ('250w', '500w', '750w', '800w'):
+            with self.subTest(width=width):
+                self.assertContains(response, width, count=2)
+        self.assertContains(response, 'sizes="(max-width: 500px) 100vw')
+        self.assertContains(response, 'loading="eager"')
+        self.assertContains(
+            self.author_client.get(reverse('posts:index')),
+            'loading="lazy"')
+
+    def test_failed_generation_is_not_retried_at_once(self):
+        """Если исходного файла нет, кеши не сбрасываются, а повтор
+        откладывается до истечения PENDING_TIMEOUT."""
+        name = 'posts/missing.gif'
+        cache.add(pending_key(name), 1)
+        version = get_version(FEED)
+        self.assertFalse(generate_thumbnails(name))
+        self.assertEqual(get_version(FEED), version)
+        self.assertTrue(cache.has_key(pending_key(name)))
+
+    def warm_thumbnails(self, **options):
+        out = StringIO()
+        call_command('warm_thumbnails', stdout=out, **options)
+        return json.loads(out.getvalue()[out.getvalue().index('{'):])
+
+    def test_warm_thumbnails(self):
+        """Команда warm_thumbnails создает недостающие миниатюры,
+        в режиме dry-run только считает их, а с файлом прогресса
+        продолжает с места остановки."""
+        posts = [
+            Post.objects.create(
+                author=self.author,
+                image=get_image(f'image{number}.gif', 'image/gif'))
+            for number in range(3)
+        ]
+        Post.objects.create(author=self.author, image=posts[0].image.name)
+        names = sorted(post.image.name for post in posts)
+        stats = self.warm_thumbnails(dry_run=True)
+        self.assertEqual((stats['total'], stats['missing']), (3, 3))
+        self.assertFalse(thumbnails_ready(names[0]))
+        progress = os.path.join(TEMP_MEDIA_ROOT, 'progress')
+        with open(progress, 'w') as file:
+            file.write(names[0])
+        stats = self.warm_thumbnails(progress=progress)
+        self.assertEqual((stats['total'], stats['generated']), (2, 2))
+        self.assertFalse(os.path.exists(progress))
+        self.assertFalse(thumbnails_ready(names[0]))
+        self.assertTrue(thumbnails_ready(names[2]))
+        stats = self.warm_thumbnails()
+        self.assertEqual(
+            (stats['ready'], stats['generated'], stats['failed']), (2, 1, 0))
+        stats = self.warm_thumbnails(force=True)
+        self.assertEqual(stats['generated'], 3)
+        self.assertTrue(all(thumbnails_ready(name) for name in names))
+
+    def collect_media_garbage(self, **options):
+        out = StringIO()
+        call_command('collect_media_garbage', stdout=out, **options)
+        return json.loads(out.getvalue()[out.getvalue().index('{'):])
+
+    def test_collect_media_garbage(self):
+        """Команда collect_media_garbage удаляет изображения без ссылок
+        и их миниатюры, не трогает свежие файлы, а в режиме report
+        ничего не удаляет."""
+        kept, deleted = (
+            Post.objects.create(
+                author=self.author,
+                image=get_image(f'garbage{number}.gif', 'image/gif'))
+            for number in range(2)
+        )
+        for post in (kept, deleted):
+            generate_thumbnails(post.image.name)
+        deleted_name = deleted.image.name
+        deleted.delete()
+        recent = default_storage.save('posts/recent.gif', ContentFile(b'1'))
+        for path, _, names in os.walk(TEMP_MEDIA_ROOT):
+            for name in names:
+                if name != 'recent.gif':
+                    os.utime(os.path.join(path, name), (0, 0))
+        media = sorted(
+            os.path.join(path, name)
+            for path, _, names in os.walk(TEMP_MEDIA_ROOT) for name in names)
+        stats = self.collect_media_garbage(report=True)
+        self.assertEqual(
+            (stats['stale_sources'], stats['orphan_images']), (1, 1))
+        self.assertGreater(stats['orphan_thumbnails'], 0)
+        self.assertEqual(sorted(
+            os.path.join(path, name)
+            for path, _, names in os.walk(TEMP_MEDIA_ROOT) for name in names
+        ), media)
+        stats = self.collect_media_garbage()
+        self.assertFalse(default_storage.exists(deleted_name))
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertTrue(default_storage.exists(recent))
+        self.assertTrue(thumbnails_ready(kept.image))
+        for geometry in settings.POST_THUMBNAIL_SIZES:
+            with self.subTest(geometry=geometry):
+                self.assertTrue(default_storage.exists(
+                    ready_thumbnail(kept.image, geometry).name))
+        stats = self.collect_media_garbage()
+        self.assertEqual(
+            (stats['stale_sources'], stats['orphan_images'],
+             stats['orphan_thumbnails']), (0, 0, 0))
+
+    def test_collect_media_garbage_rechecks_references(self):
+        """Изображение, на которое сослался пост во время сборки
+        мусора, не удаляется вместе с миниатюрами."""
+        post = Post.objects.create(
+            author=self.author, image=get_image('reused.gif', 'image/gif'))
+        generate_thumbnails(post.image.name)
+        for path, _, names in os.walk(TEMP_MEDIA_ROOT):
+            for name in names:
+                os.utime(os.path.join(path, name), (0, 0))
+        with mock.patch('posts.garbage.referenced_images',
+                        return_value=set()):
+            self.collect_media_garbage()
+        self.assertTrue(default_storage.exists(post.image.name))
+        self.assertTrue(thumbnails_ready(post.image))
+        for geometry in settings.POST_THUMBNAIL_SIZES:
+            with self.subTest(geometry=geometry):
+                self.assertTrue(default_storage.exists(
+                    ready_thumbnail(post.image, geometry).name))
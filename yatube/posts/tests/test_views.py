@@ -3,11 +3,15 @@ import tempfile
 
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from posts.cache import FEED, PAGES, bump_version
 from posts.models import Comment, Follow, Group, Post, User
+from posts.templatetags.post_cards import card_version
 
-from yatube.settings import POSTS_PER_PAGE
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 from .utils import get_image, posts_assertEqual
 
@@ -94,6 +98,65 @@ class PostViewsTest(TestCase):
                     expected_value
                 )
 
+    def test_cursor_paginator(self):
+        """Курсорная пагинация листает ленты вперед и назад."""
+        Post.objects.bulk_create(
+            Post(author=self.author, group=self.group)
+            for _ in range(POSTS_PER_PAGE + 2)
+        )
+        with override_settings(CURSOR_PAGINATED_VIEWS=(
+            'index', 'group_list', 'profile', 'follow_index'
+        )):
+            for url in (INDEX_URL, GROUP_URL, PROFILE_URL, FOLLOW_INDEX_URL):
+                with self.subTest(url=url):
+                    first = self.follower_author_client.get(
+                        url).context['page_obj']
+                    self.assertEqual(len(first), POSTS_PER_PAGE)
+                    self.assertFalse(first.has_previous())
+                    second = self.follower_author_client.get(
+                        url, {'cursor': first.next_cursor}
+                    ).context['page_obj']
+                    self.assertEqual(len(second), 3)
+                    self.assertFalse(second.has_next())
+                    self.assertTrue(set(first).isdisjoint(second))
+                    back = self.follower_author_client.get(
+                        url, {'cursor': second.previous_cursor}
+                    ).context['page_obj']
+                    self.assertEqual(list(back), list(first))
+                    self.assertEqual(
+                        list(self.follower_author_client.get(
+                            url, {'cursor': 'invalid'}
+                        ).context['page_obj']),
+                        list(first)
+                    )
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Количество запросов ленты не зависит от числа постов на ней."""
+        urls = (
+            INDEX_URL, GROUP_URL, PROFILE_URL, FOLLOW_INDEX_URL,
+            reverse('posts:profile_comments', args=[USERNAME]),
+        )
+
+        def count_queries():
+            counts = {}
+            for url in urls:
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.follower_author_client.get(url)
+                counts[url] = len(queries)
+            return counts
+
+        count_queries()  # миниатюры создаются при первом показе
+        expected = count_queries()
+        for number in range(POSTS_PER_PAGE - 1):
+            post = Post.objects.create(
+                text=f'Пост {number}', author=self.author, group=self.group)
+            Comment.objects.create(
+                text='Комментарий', author=self.user, post=post)
+            Comment.objects.create(
+                text='Комментарий', author=self.author, post=post)
+        self.assertEqual(count_queries(), expected)
+
     def test_cache(self):
         """Проверяем, что после удаления записи контент главной страницы не меняется.
            После очистки кеша, контент главной страницы изменился."""
@@ -103,6 +166,127 @@ class PostViewsTest(TestCase):
         cache.clear()
         self.assertNotEqual(init_content, self.client.get(INDEX_URL).content)
 
+    def test_cache_is_keyed_by_page_and_invalidated_on_write(self):
+        """Кеш главной страницы свой для каждой страницы пагинатора
+        и сбрасывается при создании поста и комментария."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.author)
+            for number in range(POSTS_PER_PAGE))
+        cache.clear()
+        first = self.client.get(INDEX_URL).content
+        self.assertNotEqual(
+            first, self.client.get(INDEX_URL, {'page': 2}).content)
+        self.author_client.post(CREATE_URL, data={'text': 'Свежий пост'})
+        self.assertContains(self.client.get(INDEX_URL), 'Свежий пост')
+        content = self.client.get(INDEX_URL).content
+        self.user_client.post(
+            reverse('posts:add_comment',
+                    args=[Post.objects.get(text='Свежий пост').pk]),
+            data={'text': 'Комментарий'})
+        self.assertNotEqual(content, self.client.get(INDEX_URL).content)
+
+    def test_post_cards_are_cached_by_content(self):
+        """Карточки постов берутся из кеша, а изменение показываемых
+        данных меняет ключ карточки."""
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        cache.clear()
+        cache.set(
+            f'post_card:no_group_info:{post.pk}:{card_version(post)}',
+            'Карточка из кеша'
+        )
+        self.assertContains(self.client.get(GROUP_URL), 'Карточка из кеша')
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        bump_version(FEED, PAGES)  # сбрасывает кеш страницы, но не карточек
+        self.assertContains(self.client.get(GROUP_URL), 'Новый текст')
+
+    def test_conditional_get(self):
+        """Неизмененная страница отдается ответом 304, а после новой
+        записи - снова полностью."""
+        urls = (INDEX_URL, GROUP_URL, PROFILE_URL, self.POST_URL)
+        for client in (self.client, self.user_client):
+            etags = {}
+            for url in urls:
+                with self.subTest(url=url):
+                    etags[url] = client.get(url)['ETag']
+                    self.assertEqual(
+                        client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                        .status_code,
+                        304
+                    )
+            self.user_client.post(
+                reverse('posts:add_comment', args=[self.post.pk]),
+                data={'text': 'Комментарий'})
+            for url in urls:
+                with self.subTest(url=url):
+                    self.assertEqual(
+                        client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                        .status_code,
+                        200
+                    )
+
+    def test_conditional_get_after_login(self):
+        """После повторного входа страница с формой отдается полностью:
+        в ней новый CSRF-токен."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        etag = client.get(self.POST_URL)['ETag']
+        self.assertEqual(
+            client.get(self.POST_URL, HTTP_IF_NONE_MATCH=etag).status_code,
+            304)
+        client.logout()
+        client.force_login(self.user)
+        response = client.get(self.POST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            client.post(
+                reverse('posts:add_comment', args=[self.post.pk]),
+                data={
+                    'text': 'Комментарий',
+                    'csrfmiddlewaretoken': response.context['csrf_token'],
+                }
+            ).status_code,
+            302)
+
+    def test_comments_are_paginated(self):
+        """Комментарии поста выводятся страницами по курсору в обоих
+        порядках, следующая страница доступна фрагментом,
+        а число запросов не зависит от числа комментариев."""
+        comments_url = reverse('posts:post_comments', args=[self.post.pk])
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.user_client.get(self.POST_URL)
+            return len(queries)
+
+        count_queries()  # миниатюры создаются при первом показе
+        cache.clear()
+        expected = count_queries()
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', author=self.user,
+                    post=self.post)
+            for number in range(COMMENTS_PER_PAGE + 1)
+        )
+        cache.clear()
+        self.assertEqual(count_queries(), expected)
+        all_comments = list(self.post.comments.order_by('created', 'pk'))
+        for order, expected_comments in (
+            ('newest', all_comments[::-1]),
+            ('oldest', all_comments),
+        ):
+            with self.subTest(order=order):
+                first = self.user_client.get(
+                    self.POST_URL, {'order': order}).context['comments']
+                self.assertEqual(len(first), COMMENTS_PER_PAGE)
+                response = self.user_client.get(
+                    comments_url, {'order': order,
+                                   'cursor': first.next_cursor})
+                self.assertTemplateUsed(
+                    response, 'posts/includes/comments.html')
+                second = response.context['comments']
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    list(first) + list(second), expected_comments)
+
     def test_intact_post_in_list_pages_context(self):
         """Проверка словаря контекста предаваемого в шаблоны.
            Пост попал на ленты и на "детали" без искажений."""
@@ -191,3 +375,31 @@ class PostViewsTest(TestCase):
                 author=self.author
             ).exists()
         )
+
+    def test_media_is_served_by_nginx(self):
+        """Изображения постов отдаются заголовком X-Accel-Redirect
+        с заголовками кеширования, а без nginx - самим Django; файлы
+        без поста и пути за пределы MEDIA_ROOT недоступны."""
+        url = reverse('posts:media', args=[self.post.image.name])
+        with override_settings(MEDIA_ACCEL_REDIRECT=True):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_INTERNAL_URL + self.post.image.name)
+        self.assertFalse(response.has_header('Content-Type'))
+        self.assertEqual(response.content, b'')
+        self.assertIn(
+            f'max-age={settings.MEDIA_CACHE_MAX_AGE}',
+            response['Cache-Control'])
+        with override_settings(MEDIA_ACCEL_REDIRECT=True):
+            response = self.client.get(
+                reverse('posts:media', args=['cache/ab/cd/thumbnail.jpg']))
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(url)
+        self.assertEqual(
+            b''.join(response.streaming_content), self.post.image.read())
+        for path in ('posts/missing.gif', '../manage.py', 'posts/../.env'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(
+                    f'{settings.MEDIA_URL}{path}').status_code, 404)
@@ -0,0 +1,351 @@
+"""Миниатюры изображений постов создаются вне обработки запроса.
+
+После сохранения поста создание миниатюр всех размеров
+POST_THUMBNAIL_SIZES ставится в очередь локального пула потоков
+(THUMBNAIL_WORKERS, 0 - выполнять сразу). Для каждого размера создаются
+и варианты в форматах POST_THUMBNAIL_FORMATS (WebP, AVIF) с масштабами
+POST_THUMBNAIL_SCALES для srcset. Шаблоны берут только готовые
+миниатюры из хранилища ключей sorl (для всей страницы - одним чтением
+кеша и одним запросом) и до их появления показывают заглушку; когда
+миниатюры готовы, версии кешей страниц увеличиваются.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import Pool
+from pathlib import Path
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from PIL import Image
+from posts.cache import FEED, PAGES, bump_version
+from posts.models import Post
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+# Сколько создание миниатюр считается запущенным, с: повторно
+# в очередь изображение в это время не ставится.
+PENDING_TIMEOUT = 60
+# Сколько помнится, что миниатюры изображения еще не готовы, с.
+NOT_READY_TIMEOUT = 10
+# Статусы изображений при прогреве (warm_up).
+READY = 'ready'
+MISSING = 'missing'
+GENERATED = 'generated'
+FAILED = 'failed'
+STATUSES = (READY, MISSING, GENERATED, FAILED)
+WARM_UP_CHUNK = 100
+
+logger = logging.getLogger(__name__)
+
+_executor = {}
+_executor_lock = threading.Lock()
+
+
+def thumbnail_options(source, options):
+    """Параметры миниатюры с умолчаниями - так же, как их дополняет
+    ThumbnailBackend.get_thumbnail: от них зависит имя файла."""
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_name(source, geometry, options):
+    return default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options))
+
+
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра из хранилища ключей sorl или None.
+    В отличие от get_thumbnail, изображение не открывается."""
+    return default.kvstore.get(ImageFile(
+        thumbnail_name(ImageFile(image), geometry, options), default.storage))
+
+
+def image_formats():
+    """Форматы вариантов, которые умеет записывать установленный Pillow."""
+    Image.init()
+    return [
+        format_ for format_ in settings.POST_THUMBNAIL_FORMATS
+        if format_ in Image.SAVE
+    ]
+
+
+def variant_geometries(geometry):
+    width, height = (int(side) for side in geometry.split('x'))
+    return [
+        f'{round(width * scale)}x{round(height * scale)}'
+        for scale in settings.POST_THUMBNAIL_SCALES
+    ]
+
+
+def variant_options(format_):
+    # Увеличенные сверх исходного размера варианты бесполезны в srcset.
+    return {'format': format_, 'upscale': False}
+
+
+def thumbnail_specs():
+    """Геометрия и параметры всех миниатюр изображения поста."""
+    for geometry in settings.POST_THUMBNAIL_SIZES:
+        yield geometry, {}
+        for format_ in image_formats():
+            for variant in variant_geometries(geometry):
+                yield variant, variant_options(format_)
+
+
+def load_thumbnails(names):
+    """Миниатюры всех размеров и вариантов (thumbnail_specs)
+    изображений names: {имя: {(геометрия, формат): миниатюра}}
+    или {имя: None}, если готовы не все. Записи хранилища ключей sorl
+    читаются одним get_many из его кеша и, для промахов, одним
+    запросом к базе."""
+    specs = list(thumbnail_specs())
+    keys = {}
+    for name in names:
+        source = ImageFile(name)
+        for geometry, options in specs:
+            thumbnail = ImageFile(
+                thumbnail_name(source, geometry, options), default.storage)
+            keys[add_prefix(thumbnail.key)] = (
+                name, (geometry, options.get('format')))
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missed = [key for key in keys if key not in values]
+    if missed:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missed).values_list('key', 'value'))
+        kv_cache.set_many(found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    thumbnails = {name: {} for name in names}
+    for key, (name, spec) in keys.items():
+        value = values.get(key)
+        # Кроме сериализованной миниатюры sorl кеширует и отметку
+        # об ее отсутствии.
+        if thumbnails[name] is None or not isinstance(value, str):
+            thumbnails[name] = None
+        else:
+            thumbnails[name][spec] = deserialize_image_file(value)
+    return thumbnails
+
+
+def thumbnails_ready(image):
+    name = str(image)
+    return load_thumbnails([name])[name] is not None
+
+
+def picture(thumbnails, geometry):
+    """Данные для <picture> из миниатюр load_thumbnails.
+
+    url, width, height - миниатюра в формате по умолчанию для <img>,
+    sources - тип и srcset вариантов для <source>, sizes - ширина
+    показа."""
+    thumbnail = thumbnails[(geometry, None)]
+    sources = []
+    for format_ in image_formats():
+        # Без увеличения маленькое изображение дает варианты одной ширины.
+        urls = {}
+        for variant in variant_geometries(geometry):
+            thumbnail_variant = thumbnails[(variant, format_)]
+            urls.setdefault(thumbnail_variant.width, thumbnail_variant.url)
+        sources.append({
+            'type': Image.MIME[format_],
+            'srcset': ', '.join(
+                f'{url} {width}w' for width, url in urls.items()),
+        })
+    return {
+        'url': thumbnail.url,
+        'width': thumbnail.width,
+        'height': thumbnail.height,
+        'sources': sources,
+        'sizes': f'(max-width: {thumbnail.width}px) 100vw, '
+                 f'{thumbnail.width}px',
+    }
+
+
+def pictures_key(name):
+    return f'thumbnails_pictures:{name}'
+
+
+def responsive_thumbnails(images):
+    """{имя изображения: {размер: picture}} для изображений images,
+    None вместо словаря, если миниатюры изображения еще не готовы.
+
+    Готовность проверяется одним load_thumbnails на все изображения
+    из промахов кеша. Результат кешируется на POST_CARD_CACHE_TIMEOUT,
+    отсутствие миниатюр - на NOT_READY_TIMEOUT."""
+    names = list(dict.fromkeys(str(image) for image in images if image))
+    cached = cache.get_many([pictures_key(name) for name in names])
+    pictures = {
+        name: cached[pictures_key(name)] or None
+        for name in names if pictures_key(name) in cached
+    }
+    missed = [name for name in names if name not in pictures]
+    if not missed:
+        return pictures
+    ready, not_ready = {}, {}
+    for name, thumbnails in load_thumbnails(missed).items():
+        if thumbnails is None:
+            pictures[name] = None
+            not_ready[pictures_key(name)] = False
+            continue
+        pictures[name] = {
+            geometry: picture(thumbnails, geometry)
+            for geometry in settings.POST_THUMBNAIL_SIZES
+        }
+        ready[pictures_key(name)] = pictures[name]
+    cache.set_many(ready, settings.POST_CARD_CACHE_TIMEOUT)
+    cache.set_many(not_ready, NOT_READY_TIMEOUT)
+    return pictures
+
+
+def pending_key(name):
+    return f'thumbnails_pending:{name}'
+
+
+def create_thumbnails(name):
+    """Создает миниатюры всех размеров; True, если все они готовы."""
+    try:
+        for geometry, options in thumbnail_specs():
+            get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+        return False
+    if not thumbnails_ready(name):
+        logger.warning('Не удалось создать миниатюры %s', name)
+        return False
+    cache.delete(pictures_key(name))
+    return True
+
+
+def generate_thumbnails(name):
+    """Создает миниатюры и сбрасывает кеши страниц, в которых до этого
+    стояла заглушка. После неудачи (например, исходный файл недоступен)
+    повтор возможен не раньше, чем через PENDING_TIMEOUT."""
+    if not create_thumbnails(name):
+        return False
+    cache.delete(pending_key(name))
+    bump_version(FEED, PAGES)
+    return True
+
+
+def executor():
+    # Пул свой у каждого процесса: потоки не переживают fork.
+    pid = os.getpid()
+    with _executor_lock:
+        if pid not in _executor:
+            _executor.clear()
+            _executor[pid] = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor[pid]
+
+
+def _generate_in_thread(name):
+    try:
+        generate_thumbnails(name)
+    finally:
+        connections.close_all()
+
+
+def submit(name):
+    if settings.THUMBNAIL_WORKERS:
+        executor().submit(_generate_in_thread, name)
+    else:
+        generate_thumbnails(name)
+
+
+def schedule_thumbnails(image):
+    """Ставит создание миниатюр image в очередь после фиксации текущей
+    транзакции. Пока создание не завершено, повторные вызовы
+    ничего не делают."""
+    if not image or not cache.add(pending_key(image.name), 1,
+                                  PENDING_TIMEOUT):
+        return
+    name = image.name
+    transaction.on_commit(lambda: submit(name))
+
+
+def warm_thumbnail(task):
+    """Создает недостающие миниатюры изображения, при force -
+    пересоздает все. Выполняется и в процессах пула."""
+    name, force, dry_run = task
+    if not force and thumbnails_ready(name):
+        return name, READY
+    if dry_run:
+        return name, MISSING
+    if force:
+        default.kvstore.delete_thumbnails(ImageFile(name))
+    return name, GENERATED if create_thumbnails(name) else FAILED
+
+
+def image_name_batches(after=None):
+    """Имена изображений постов по возрастанию без повторов, пачками
+    по WARM_UP_CHUNK: каждая пачка - отдельный короткий запрос."""
+    names = Post.objects.exclude(image='').order_by('image').values_list(
+        'image', flat=True).distinct()
+    while True:
+        batch = list(
+            (names.filter(image__gt=after) if after else names)
+            [:WARM_UP_CHUNK]
+        )
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]
+
+
+def warm_up(workers=1, force=False, dry_run=False, progress=None, log=None):
+    """Создает недостающие миниатюры всех изображений постов
+    в workers процессах.
+
+    После каждой пачки имя последнего обработанного изображения
+    записывается в файл progress: повторный запуск продолжает с него,
+    после завершения файл удаляется. Возвращает число изображений
+    по статусам, время и скорость обработки."""
+    log = log or (lambda message: None)
+    progress = progress and Path(progress)
+    after = None
+    if progress and progress.exists():
+        after = progress.read_text().strip() or None
+        log(f'Продолжение после {after}')
+    stats = dict.fromkeys(STATUSES, 0)
+    done = 0
+    start = monotonic()
+    if workers > 1:
+        # Процессы пула не должны унаследовать открытые соединения.
+        connections.close_all()
+    with (Pool(workers) if workers > 1 else nullcontext()) as pool:
+        for batch in image_name_batches(after):
+            for name, status in (pool.imap if pool else map)(
+                warm_thumbnail, [(name, force, dry_run) for name in batch]
+            ):
+                stats[status] += 1
+            done += len(batch)
+            if progress and not dry_run:
+                progress.write_text(batch[-1])
+            log(f'  {done}: {done / (monotonic() - start):.1f} изобр./с')
+    if progress and not dry_run and progress.exists():
+        progress.unlink()
+    if stats[GENERATED]:
+        bump_version(FEED, PAGES)
+    seconds = monotonic() - start
+    stats['total'] = done
+    stats['seconds'] = round(seconds, 2)
+    stats['per_second'] = round(done / seconds, 1) if seconds else None
+    return stats
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from posts import views
 
@@ -43,6 +44,9 @@ urlpatterns = [
     path('posts/<int:post_id>/',
          views.post_detail,
          name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('create/',
          views.post_create,
          name='post_create'),
@@ -70,4 +74,7 @@ urlpatterns = [
     path('group/<slug:slug>/unfollow/',
          views.group_unfollow,
          name='group_unfollow'),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>",
+         views.media,
+         name='media'),
 ]
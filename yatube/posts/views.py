@@ -1,8 +1,27 @@
+import posixpath
+from urllib.parse import quote
+
+from core.decorators import cache_for_anonymous, query_budget
+from core.paginator import CursorPaginator
+from core.storage import release
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django.views.static import serve
+from posts import etags
+from posts.cache import FEED, PAGES, bump_version, get_version
+from posts.counters import bump_group, bump_user, bump_users
+from posts.follows import get_follow_set
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, GroupFollow, Post, User
+from posts.models import FeedEntry, Follow, Group, GroupFollow, Post, User
+from posts.thumbnails import schedule_thumbnails
+from sorl.thumbnail.conf import settings as thumbnail_settings
 
 from yatube.settings import POSTS_PER_PAGE
 
@@ -11,132 +30,187 @@ def paginator(request, objects, per_page):
     return Paginator(objects, per_page).get_page(request.GET.get('page'))
 
 
+COMMENT_ORDERS = ('newest', 'oldest')
+
+
+def comments_page(request, post):
+    """Страница комментариев поста по курсору из ?cursor=,
+    ?order=oldest - от старых к новым, иначе - от новых к старым."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERS:
+        order = COMMENT_ORDERS[0]
+    return {
+        'post': post,
+        'comments': CursorPaginator(
+            post.comments.select_related('author'),
+            settings.COMMENTS_PER_PAGE,
+            descending=order == 'newest'
+        ).get_page(request.GET.get('cursor')),
+        'order': order,
+    }
+
+
+def feed_paginator(request, posts, keys=('created', 'id')):
+    """Пагинация ленты постов. Для представлений из
+    CURSOR_PAGINATED_VIEWS используется курсорная пагинация по keys."""
+    if request.resolver_match.url_name in settings.CURSOR_PAGINATED_VIEWS:
+        return CursorPaginator(posts, POSTS_PER_PAGE, keys).get_page(
+            request.GET.get('cursor'))
+    return paginator(request, posts, POSTS_PER_PAGE)
+
+
+@cache_for_anonymous
+@query_budget(6)
+@condition(etag_func=etags.index_etag)
 def index(request):
     return render(request, 'posts/index.html', {
-        'page_obj': paginator(request, Post.objects.all(), POSTS_PER_PAGE)
+        'page_obj': feed_paginator(request, Post.objects.for_feed()),
+        'feed_version': get_version(FEED),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT
     })
 
 
+@cache_for_anonymous
+@query_budget(5)
 def authors(request):
     return render(request, 'posts/authors.html', {
-        'page_obj': paginator(request, User.objects.all(), 3)
+        'page_obj': paginator(
+            request, User.objects.select_related('counters'), 3),
+        'follow_set': get_follow_set(request)
     })
 
 
+@query_budget(5)
 def authors_follow(request):
-    authors = User.objects.filter(following__user=request.user)
+    authors = User.objects.select_related('counters').filter(
+        following__user=request.user)
     return render(request, 'posts/authors_follow.html', {
-        'page_obj': paginator(request, authors, 3)
+        'page_obj': paginator(request, authors, 3),
+        'follow_set': get_follow_set(request)
     })
 
 
+@cache_for_anonymous
+@query_budget(5)
 def groups(request):
     return render(request, 'posts/groups.html', {
-        'page_obj': paginator(request, Group.objects.all(), 3)
+        'page_obj': paginator(request, Group.objects.all(), 3),
+        'follow_set': get_follow_set(request)
     })
 
 
+@query_budget(5)
 def groups_follow(request):
     groups = Group.objects.filter(group_following__user=request.user)
     return render(request, 'posts/groups_follow.html', {
-        'page_obj': paginator(request, groups, 3)
+        'page_obj': paginator(request, groups, 3),
+        'follow_set': get_follow_set(request)
     })
 
 
+@cache_for_anonymous
+@query_budget(8)
+@condition(etag_func=etags.group_posts_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': paginator(request, group.posts.all(), POSTS_PER_PAGE),
-        'following': (
-            request.user.is_authenticated
-            and GroupFollow.objects.filter(
-                user=request.user,
-                group=group).exists()
-        )
+        'page_obj': feed_paginator(request, group.posts.for_feed()),
+        'feed_version': get_version(FEED),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'following': get_follow_set(request).follows_group(group)
     })
 
 
+@query_budget(5)
 def group_description(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(
         request,
         'posts/includes/views/group_description.html',
         {'group': group,
-         'following': (
-             request.user.is_authenticated
-             and GroupFollow.objects.filter(
-                 user=request.user,
-                 group=group).exists()
-         )}
+         'following': get_follow_set(request).follows_group(group)}
     )
 
 
 def profile_generic(request, author, page_obj, template_name):
+    follow_set = get_follow_set(request)
     return render(request, template_name, {
         'author': author,
         'page_obj': page_obj,
-        'following': (
-            request.user.is_authenticated
-            and request.user != author
-            and Follow.objects.filter(
-                user=request.user,
-                author=author).exists()
-        )
+        'following': follow_set.follows_author(author),
+        'follow_set': follow_set
     })
 
 
+@cache_for_anonymous
+@query_budget(8)
+@condition(etag_func=etags.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     return profile_generic(
         request,
         author,
-        paginator(request, author.posts.all(), POSTS_PER_PAGE),
+        feed_paginator(request, author.posts.for_feed()),
         'posts/profile.html'
     )
 
 
+@query_budget(6)
 def profile_comments(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     return profile_generic(
         request,
         author,
-        paginator(request, author.comments.all(), POSTS_PER_PAGE),
+        paginator(
+            request,
+            author.comments.select_related('author'),
+            POSTS_PER_PAGE),
         'posts/profile_content/profile_comments.html'
     )
 
 
+@query_budget(6)
 def profile_following(request, username):
     """Вывод списка пользователей, подписанных на автора."""
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     return profile_generic(
         request,
         author,
         paginator(
             request,
-            User.objects.filter(follower__author=author),
+            User.objects.select_related('counters').filter(
+                follower__author=author),
             POSTS_PER_PAGE),
         'posts/profile_content/profile_following.html'
     )
 
 
+@query_budget(6)
 def profile_follower(request, username):
     """Вывод списка авторов, на которых подписан пользователь."""
-    follower = get_object_or_404(User, username=username)
+    follower = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     return profile_generic(
         request,
         follower,
         paginator(
             request,
-            User.objects.filter(following__user=follower),
+            User.objects.select_related('counters').filter(
+                following__user=follower),
             POSTS_PER_PAGE),
         'posts/profile_content/profile_follower.html'
     )
 
 
+@query_budget(6)
 def profile_group_follower(request, username):
     """Вывод списка групп, на которые подписан пользователь."""
-    follower = get_object_or_404(User, username=username)
+    follower = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     groups = Group.objects.filter(group_following__user=follower)
     return profile_generic(
         request,
@@ -146,13 +220,31 @@ def profile_group_follower(request, username):
     )
 
 
+@cache_for_anonymous
+@query_budget(6)
+@condition(etag_func=etags.post_detail_etag)
 def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id)
     return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, id=post_id),
+        **comments_page(request, post),
         'form': CommentForm()
     })
 
 
+@cache_for_anonymous
+@query_budget(4)
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев
+    для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    return render(
+        request,
+        'posts/includes/comments.html',
+        comments_page(request, post)
+    )
+
+
+@query_budget(20)
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -162,15 +254,23 @@ def post_create(request):
         })
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    with transaction.atomic():
+        post.save()
+        bump_user(post.author, posts_count=1)
+        bump_group(post.group, posts_count=1)
+        schedule_thumbnails(post.image)
+    bump_version(FEED, PAGES)
     return redirect('posts:profile', username=post.author)
 
 
+@query_budget(12)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
+    old_group = post.group
+    old_image = post.image.name
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -180,10 +280,19 @@ def post_edit(request, post_id):
         return render(request, 'posts/create_post.html', {
             'form': form, 'is_edit': True
         })
-    form.save()
+    with transaction.atomic():
+        form.save()
+        if post.group != old_group:
+            bump_group(old_group, posts_count=-1)
+            bump_group(post.group, posts_count=1)
+        if 'image' in form.changed_data:
+            release(post.image.storage, old_image)
+            schedule_thumbnails(post.image)
+    bump_version(FEED, PAGES)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(20)
 @login_required
 def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -191,13 +300,24 @@ def post_delete(request, post_id):
         return redirect('posts:post_detail', post_id=post_id)
     if request.method == 'POST':
         author = post.author
-        post.delete()
+        with transaction.atomic():
+            commentators = {
+                commentator: -total for commentator, total in
+                post.comments.order_by().values_list('author')
+                .annotate(total=Count('pk'))
+            }
+            post.delete()
+            bump_user(author, posts_count=-1)
+            bump_users('comments_count', commentators)
+            bump_group(post.group, posts_count=-1)
+        bump_version(FEED, PAGES)
         return redirect('posts:profile', username=author)
     return render(request, 'posts/delete_post.html', {
         'post': post
     })
 
 
+@query_budget(14)
 @login_required
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
@@ -205,49 +325,130 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = get_object_or_404(Post, pk=post_id)
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            bump_user(comment.author, comments_count=1)
+        bump_version(FEED, PAGES)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(10)
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    page_obj = feed_paginator(
+        request,
+        FeedEntry.objects.timeline(request.user),
+        keys=('created', 'post_id')
+    )
+    page_obj.object_list = Post.objects.for_feed().for_entries(page_obj)
     return render(request, 'posts/follow.html', {
-        'page_obj': paginator(request, posts, POSTS_PER_PAGE)
+        'page_obj': page_obj
     })
 
 
+@query_budget(16)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author)
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(
+                user=request.user,
+                author=author)
+            if created:
+                bump_user(author, followers_count=1)
+                bump_user(request.user, followings_count=1)
+    bump_version(PAGES)
     return redirect('posts:profile', username=username)
 
 
+@query_budget(14)
 @login_required
 def group_follow(request, slug):
-    GroupFollow.objects.get_or_create(
-        user=request.user,
-        group=get_object_or_404(Group, slug=slug))
+    group = get_object_or_404(Group, slug=slug)
+    with transaction.atomic():
+        _, created = GroupFollow.objects.get_or_create(
+            user=request.user,
+            group=group)
+        if created:
+            bump_group(group, followers_count=1)
+            bump_user(request.user, group_follows_count=1)
+    bump_version(PAGES)
     return redirect('posts:group_list', slug=slug)
 
 
+@query_budget(12)
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(
+    follow = get_object_or_404(
         request.user.follower,
         author__username=username
-    ).delete()
+    )
+    author = User(pk=follow.author_id)
+    with transaction.atomic():
+        follow.delete()
+        bump_user(author, followers_count=-1)
+        bump_user(request.user, followings_count=-1)
+    bump_version(PAGES)
     return redirect('posts:profile', username=username)
 
 
+@query_budget(10)
 @login_required
 def group_unfollow(request, slug):
-    get_object_or_404(
+    group_follow = get_object_or_404(
         request.user.group_follower,
         group__slug=slug
-    ).delete()
+    )
+    with transaction.atomic():
+        group_follow.delete()
+        bump_group(Group(pk=group_follow.group_id), followers_count=-1)
+        bump_user(request.user, group_follows_count=-1)
+    bump_version(PAGES)
     return redirect('posts:group_list', slug=slug)
+
+
+def media_name(path):
+    """Нормализованное имя файла в MEDIA_ROOT или None для путей
+    за его пределы и скрытых файлов."""
+    name = posixpath.normpath(path)
+    if name.startswith('/') or any(
+        part.startswith('.') for part in name.split('/')
+    ):
+        return None
+    return name
+
+
+def media_is_immutable(name):
+    # Имена миниатюр и файлов хранилища по хешу зависят от содержимого.
+    return name.startswith(thumbnail_settings.THUMBNAIL_PREFIX) or getattr(
+        Post._meta.get_field('image').storage, 'refcounted', False)
+
+
+@query_budget(3)
+def media(request, path):
+    """Отдает миниатюры и изображения существующих постов: изображения
+    удаленных постов недоступны и до сборки мусора. При
+    MEDIA_ACCEL_REDIRECT файл отдает nginx по X-Accel-Redirect."""
+    name = media_name(path)
+    if name is None or not (
+        name.startswith(thumbnail_settings.THUMBNAIL_PREFIX)
+        or Post.objects.filter(image=name).exists()
+    ):
+        raise Http404
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_INTERNAL_URL + quote(
+            name)
+        # Тип содержимого nginx определит по расширению файла.
+        del response['Content-Type']
+    else:
+        response = serve(request, name, document_root=settings.MEDIA_ROOT)
+    if media_is_immutable(name):
+        patch_cache_control(
+            response, public=True, immutable=True,
+            max_age=settings.MEDIA_IMMUTABLE_MAX_AGE)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
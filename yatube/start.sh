@@ -19,5 +19,7 @@ from django.contrib.contenttypes.models import ContentType
 ContentType.objects.all().delete()
 END
 python manage.py loaddata dump.json
+python manage.py recount_counters
+python manage.py rebalance_feeds
 
 gunicorn yatube.wsgi:application --bind 0:8000
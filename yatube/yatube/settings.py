@@ -23,7 +23,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,6 +104,38 @@ else:
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media отдает представление posts.views.media: при MEDIA_ACCEL_REDIRECT
+# после проверки доступа оно возвращает только заголовок X-Accel-Redirect
+# на внутренний location MEDIA_INTERNAL_URL, а файл отдает nginx
+# (infra/nginx.conf). Без nginx файл отдает Django.
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', default=DOCKER)
+MEDIA_INTERNAL_URL = '/protected-media/'
+# Время кеширования media браузерами и прокси, с. Миниатюры и файлы
+# хранилища по хешу содержимого не меняются под тем же именем.
+MEDIA_CACHE_MAX_AGE = int(
+    os.getenv('MEDIA_CACHE_MAX_AGE', default=24 * 60 * 60))
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# При CONTENT_ADDRESSED_MEDIA загружаемые файлы именуются по хешу
+# содержимого, раскладываются по вложенным каталогам и не дублируются
+# (core.storage). Миниатюры sorl хранятся в обычном хранилище.
+CONTENT_ADDRESSED_MEDIA = os.getenv('CONTENT_ADDRESSED_MEDIA', default=False)
+STORAGES = {
+    'default': {
+        'BACKEND': (
+            'core.storage.ContentAddressedStorage'
+            if CONTENT_ADDRESSED_MEDIA
+            else 'django.core.files.storage.FileSystemStorage'
+        ),
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+# Путь к классу, а не псевдоним из STORAGES: sorl-thumbnail 12.x
+# (requirements.txt) псевдонимы не поддерживает.
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -110,12 +145,83 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Ленты постов (имена url), в которых вместо номеров страниц
+# используется курсорная пагинация по (created, id): без COUNT(*) и OFFSET.
+# Возможные значения: 'index', 'group_list', 'profile', 'follow_index'.
+CURSOR_PAGINATED_VIEWS = ()
+
+# Посты авторов, у которых подписчиков больше этого числа, не раскладываются
+# по лентам подписчиков при публикации, а подмешиваются в ленту при чтении.
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', default=10000))
+# Посты автора снова раскладываются по лентам, когда подписчиков становится
+# не больше этого числа (но не больше FEED_FANOUT_THRESHOLD): разрыв между
+# порогами не дает частым подпискам и отпискам повторять заполнение лент.
+# Переход выполняет команда rebalance_feeds.
+FEED_PUSH_THRESHOLD = int(
+    os.getenv('FEED_PUSH_THRESHOLD', default=FEED_FANOUT_THRESHOLD // 2))
+
+# Бюджет SQL-запросов на представление (см. core.decorators.query_budget).
+# В режиме DEBUG превышение пишется в лог, при QUERY_BUDGET_RAISE - ошибка.
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', default=False)
 
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+# Кеш, общий для всех воркеров на одном хосте, без внешнего сервиса:
+# файл SQLite, например, в памяти - /dev/shm/yatube-cache.sqlite3.
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH')
+if SHARED_CACHE_PATH:
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.SharedSQLiteCache',
+        'LOCATION': SHARED_CACHE_PATH,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SHARED_CACHE_MAX_ENTRIES', default=10000)),
+        },
+    }
+
+# Время жизни кеша ленты главной страницы, с. Кеш сбрасывается при
+# создании, изменении и удалении постов и добавлении комментариев.
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', default=60 * 60))
+
+# Время жизни кеша карточек постов, с. Ключ карточки меняется вместе
+# с ее содержимым, поэтому TTL ограничивает только занимаемую память.
+POST_CARD_CACHE_TIMEOUT = int(
+    os.getenv('POST_CARD_CACHE_TIMEOUT', default=24 * 60 * 60))
+
+# Время жизни кеша страниц для анонимных пользователей, с. Кеш
+# сбрасывается при изменении постов, комментариев и подписок.
+ANONYMOUS_CACHE_TIMEOUT = int(
+    os.getenv('ANONYMOUS_CACHE_TIMEOUT', default=60 * 60))
+
+# Время жизни кешированного набора подписок пользователя, с. Набор
+# удаляется из кеша при каждой подписке и отписке.
+FOLLOW_SET_CACHE_TIMEOUT = int(
+    os.getenv('FOLLOW_SET_CACHE_TIMEOUT', default=24 * 60 * 60))
+
+# Размеры миниатюр изображений постов: создаются в фоне после
+# сохранения поста (posts.thumbnails) потоками THUMBNAIL_WORKERS,
+# 0 - сразу после фиксации транзакции.
+POST_THUMBNAIL_SIZES = ('300x300', '500x500')
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', default=2))
+
+# Варианты миниатюр для srcset: масштабы размеров из POST_THUMBNAIL_SIZES
+# и форматы (не поддерживаемые установленным Pillow пропускаются).
+POST_THUMBNAIL_SCALES = (0.5, 1, 1.5, 2)
+POST_THUMBNAIL_FORMATS = ('AVIF', 'WEBP')
+
+# Загружаемые изображения постов: ограничения объема (байт) и числа
+# пикселей, максимальный размер после уменьшения и качество
+# перекодирования (см. posts.images).
+POST_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('POST_IMAGE_MAX_UPLOAD_SIZE', default=20 * 1024 * 1024))
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+POST_IMAGE_MAX_SIZE = (2048, 2048)
+POST_IMAGE_QUALITY = 85
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 